@@ -1,9 +1,16 @@
 import os
+import functools
+import types
 from dotenv import load_dotenv
 
+API_KEY_NAMES = ("DART_API_KEY", "ECOS_API_KEY", "KOSIS_API_KEY")
+
+@functools.lru_cache(maxsize=1)
 def load_env():
     # Load .env if present; environment variables override .env
-    load_dotenv(override=False)
+    # 필요한 키가 이미 환경변수에 모두 있으면 .env 파싱 자체를 생략
+    if not all(k in os.environ for k in API_KEY_NAMES):
+        load_dotenv(override=False)
     cfg = {
         "DART_API_KEY": os.getenv("DART_API_KEY", ""),
         "ECOS_API_KEY": os.getenv("ECOS_API_KEY", ""),
@@ -15,4 +22,5 @@ def load_env():
     missing = [k for k, v in cfg.items() if k.endswith("_API_KEY") and not v]
     if missing:
         print(f"[WARN] Missing API keys in env: {missing}. Some steps may fail.")
-    return cfg
+    # 캐시된 하나의 객체를 여러 호출자가 공유하므로 읽기 전용으로 반환
+    return types.MappingProxyType(cfg)
@@ -1,31 +1,203 @@
+import math
 import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Iterable, List, Optional, Tuple
+
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+
+from common.disk_cache import DiskCache
 
 BASE_URL = "https://opendart.fss.or.kr/api"
+CACHE_DIR = ".cache/dart"
+CACHE_TTL_DAYS = 7       # 최근 윈도우의 신규 공시를 놓치지 않도록 1주 후 만료
+CACHEABLE_STATUS = {"000", "013"}  # 정상/무데이터만 캐시(레이트리밋 등 오류 응답은 캐시 안 함)
+BACKOFF_CAP_SEC = 0.4  # 재시도 대기 상한(느린 요청 하나가 배치 전체를 붙잡지 않도록 낮게 유지)
+
+# 헤지 요청(hedged request): 첫 요청이 p95 지연을 넘기면 같은 요청을 한 번 더 보내고 먼저 온 응답 사용.
+# p95는 최근 지연의 EWMA 평균/분산으로 근사(평균 + 1.645σ)하고 아래 범위로 클램프.
+HEDGE_MIN_SEC = 0.3
+HEDGE_MAX_SEC = 5.0
+LATENCY_EWMA_ALPHA = 0.1
+
+# 전역 레이트리밋: 스레드(get_many/헤지)가 몇 개든 클라이언트 전체 요청률을 초당 RATE_LIMIT_PER_SEC로 제한.
+# 호출부마다 time.sleep을 넣는 대신 토큰이 남아 있으면 바로 보내고, 모자랄 때만 필요한 만큼 대기.
+RATE_LIMIT_PER_SEC = 10.0
+RATE_BURST = 10
+
+
+class _TokenBucket:
+    """스레드 안전 토큰 버킷(초당 rate개 충전, 최대 burst개까지 누적)."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.t_last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.t_last) * self.rate)
+                self.t_last = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait_sec = (1.0 - self.tokens) / self.rate
+            # 락 밖에서 대기(다른 스레드의 충전 계산을 막지 않음)
+            time.sleep(wait_sec)
+
 
 class DartClient:
-    def __init__(self, api_key: str, sleep_sec: float = 0.2, max_retries: int = 3):
+    def __init__(self, api_key: str, sleep_sec: float = 0.2, max_retries: int = 3,
+                 pool_connections: int = 8, pool_maxsize: int = 32, hedge: bool = True,
+                 cache_dir: Optional[str] = CACHE_DIR, cache_ttl_days: Optional[float] = CACHE_TTL_DAYS,
+                 rate_per_sec: Optional[float] = RATE_LIMIT_PER_SEC, rate_burst: int = RATE_BURST):
         self.api_key = api_key
+        # 캐시 적중은 네트워크를 타지 않으므로 토큰을 쓰지 않음(_http_get에서만 acquire). None이면 제한 없음.
+        self._bucket = _TokenBucket(rate_per_sec, rate_burst) if rate_per_sec else None
+        # 재실행(크래시 후 재개 등) 시 같은 요청은 네트워크 없이 디스크에서 응답. cache_dir=None이면 끔.
+        self._cache = DiskCache(cache_dir, ttl_days=cache_ttl_days) if cache_dir else None
         self.sleep_sec = sleep_sec
         self.max_retries = max_retries
+        self._hedge_pool = ThreadPoolExecutor(max_workers=pool_maxsize) if hedge else None
+        self._lat_lock = threading.Lock()
+        self._lat_mean = None
+        self._lat_var = 0.0
+        # keep-alive 세션: 요청마다 TCP/TLS 핸드셰이크를 반복하지 않도록 커넥션 재사용
+        # (재시도는 아래 get()에서 직접 처리하므로 어댑터 레벨 재시도는 끔)
+        # pool_block=True: 호스트당 커넥션을 pool_maxsize개로 제한하고 초과 요청은 빈 커넥션을 기다림
+        # (get_many/헤지 스레드가 몰려도 일회용 커넥션을 새로 열었다 버리지 않음)
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                              max_retries=0, pool_block=True)
+        self._session.mount("https://", adapter)
+
+    def close(self):
+        if self._hedge_pool is not None:
+            self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     def get(self, endpoint: str, params: dict):
+        if self._cache is None:
+            return self._fetch_json(endpoint, params)
+        # 키에는 API 키를 넣지 않음(키를 바꿔도 캐시 재사용)
+        key = DiskCache.make_key(endpoint, params or {})
+        j = self._cache.get_json(key)
+        if j is not None:
+            return j
+        j = self._fetch_json(endpoint, params)
+        if isinstance(j, dict) and str(j.get("status", "")) in CACHEABLE_STATUS:
+            self._cache.put_json(key, j)
+        return j
+
+    def _fetch_json(self, endpoint: str, params: dict):
         url = f"{BASE_URL}/{endpoint}.json"
         p = {"crtfc_key": self.api_key}
         p.update(params or {})
         for attempt in range(self.max_retries):
-            r = requests.get(url, params=p, timeout=30)
+            r = self._hedged_get(url, p, timeout=30)
             if r.status_code == 200:
-                return r.json()
-            time.sleep(self.sleep_sec * (attempt + 1))
+                # orjson: bytes를 바로 파싱(str 디코드 생략, stdlib json 대비 수 배 빠름)
+                return orjson.loads(r.content)
+            time.sleep(self._backoff_sec(attempt))
         r.raise_for_status()
 
+    def _http_get(self, url: str, params: Optional[dict] = None, timeout: float = 60):
+        # 모든 실제 HTTP 요청(헤지 중복/재시도 포함)이 지나는 단일 지점에서 토큰 소비
+        if self._bucket is not None:
+            self._bucket.acquire()
+        return self._session.get(url, params=params, timeout=timeout)
+
+    def _timed_get(self, url: str, params: dict, timeout: float):
+        t0 = time.monotonic()
+        r = self._http_get(url, params, timeout)
+        self._observe_latency(time.monotonic() - t0)
+        return r
+
+    def _observe_latency(self, sec: float):
+        with self._lat_lock:
+            if self._lat_mean is None:
+                self._lat_mean = sec
+                return
+            d = sec - self._lat_mean
+            self._lat_mean += LATENCY_EWMA_ALPHA * d
+            self._lat_var = (1 - LATENCY_EWMA_ALPHA) * (self._lat_var + LATENCY_EWMA_ALPHA * d * d)
+
+    def _hedge_after_sec(self) -> float:
+        with self._lat_lock:
+            if self._lat_mean is None:
+                return HEDGE_MAX_SEC
+            p95 = self._lat_mean + 1.645 * math.sqrt(self._lat_var)
+        return min(HEDGE_MAX_SEC, max(HEDGE_MIN_SEC, p95))
+
+    def _hedged_get(self, url: str, params: dict, timeout: float):
+        """
+        GET은 멱등이므로, 첫 요청이 _hedge_after_sec() 안에 끝나지 않으면 중복 요청을 하나 더 보내
+        먼저 성공한 응답을 사용. 늦은 쪽은 취소(이미 실행 중이면 결과만 버림).
+        """
+        if self._hedge_pool is None:
+            return self._timed_get(url, params, timeout)
+        first = self._hedge_pool.submit(self._timed_get, url, params, timeout)
+        done, _ = wait([first], timeout=self._hedge_after_sec())
+        if done:
+            return first.result()
+        second = self._hedge_pool.submit(self._timed_get, url, params, timeout)
+        futures = [first, second]
+        err = None
+        for f in as_completed(futures):
+            if f.exception() is None:
+                for other in futures:
+                    other.cancel()
+                return f.result()
+            err = f.exception()
+        raise err
+
+    def _backoff_sec(self, attempt: int) -> float:
+        # 지수 백오프 + 지터: sleep_sec, 2x, 4x ... (BACKOFF_CAP_SEC 상한)
+        return random.uniform(0.5, 1.0) * min(BACKOFF_CAP_SEC, self.sleep_sec * (2 ** attempt))
+
+    def get_many(self, calls: Iterable[Tuple[str, dict]], max_workers: int = 8) -> List[dict]:
+        """
+        (endpoint, params) 목록을 스레드 풀로 동시 호출하고 입력 순서대로 결과를 반환.
+        세션 커넥션 풀(pool_maxsize)을 공유하므로 max_workers는 그 이하로 둘 것.
+        개별 호출 실패는 빈 dict로 채움(한 건 실패로 배치 전체가 멈추지 않게).
+        """
+        def one(call):
+            endpoint, params = call
+            try:
+                return self.get(endpoint, params) or {}
+            except Exception as e:
+                print(f"[WARN] {endpoint} fail params={params}: {e}")
+                return {}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            return list(ex.map(one, calls))
+
     def get_corp_code_zip(self):
         # corpCode is served as ZIP (XML inside). Use the special path.
+        key = DiskCache.make_key("corpCode")
+        if self._cache is not None:
+            blob = self._cache.get_bytes(key, ".zip")
+            if blob is not None:
+                return blob
         url = f"{BASE_URL}/corpCode.xml"
         p = {"crtfc_key": self.api_key}
-        r = requests.get(url, params=p, timeout=60)
+        r = self._http_get(url, p, timeout=60)
         r.raise_for_status()
+        if self._cache is not None:
+            self._cache.put_bytes(key, r.content, ".zip")
         return r.content
 
     def get_ok(self, endpoint: str, params: dict):
@@ -42,12 +214,12 @@ class DartClient:
         """
         url = f"https://opendart.fss.or.kr/api/document.xml"
         p = {"crtfc_key": self.api_key, "rcept_no": rcept_no}
-        r = requests.get(url, params=p, timeout=60)
+        r = self._http_get(url, p, timeout=60)
         r.raise_for_status()
         return r.content
 
     def get_binary(self, url: str) -> bytes:
         """첨부/본문 파일(HTML/XBRL 등) 바이너리 다운로드 헬퍼."""
-        r = requests.get(url, timeout=60)
+        r = self._http_get(url, timeout=60)
         r.raise_for_status()
         return r.content
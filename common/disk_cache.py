@@ -0,0 +1,61 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import tempfile
+from typing import Optional
+
+import orjson
+
+
+class DiskCache:
+    """
+    키 해시 기반 디스크 캐시. key → <root>/<blake2b>.<suffix>
+    - 쓰기는 임시파일 + os.replace로 원자적으로 처리(중간에 죽어도 깨진 캐시가 남지 않음)
+    - ttl_days가 있으면 파일 mtime 기준으로 만료
+    """
+
+    def __init__(self, root: str, ttl_days: Optional[float] = None):
+        self.root = root
+        self.ttl_days = ttl_days
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.root, f"{key}{suffix}")
+
+    def get_bytes(self, key: str, suffix: str = ".bin", ttl_days: Optional[float] = None) -> Optional[bytes]:
+        p = self._path(key, suffix)
+        ttl = self.ttl_days if ttl_days is None else ttl_days
+        try:
+            if ttl is not None and time.time() - os.path.getmtime(p) > ttl * 86400:
+                return None
+            with open(p, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put_bytes(self, key: str, data: bytes, suffix: str = ".bin"):
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, self._path(key, suffix))
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def get_json(self, key: str, ttl_days: Optional[float] = None):
+        blob = self.get_bytes(key, ".json.gz", ttl_days)
+        if blob is None:
+            return None
+        return orjson.loads(gzip.decompress(blob))
+
+    def put_json(self, key: str, obj):
+        self.put_bytes(key, gzip.compress(orjson.dumps(obj), compresslevel=3), ".json.gz")
@@ -1,18 +1,80 @@
 import os
+import functools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 from transform.metrics import (
     compute_profit_rate, compute_risk_rate, compute_asset_acq_amt,
-    compute_topk_share, compute_top100_companies
+    compute_topk_share, compute_top100_companies, add_year_column, level_lookup, YEAR_COL,
+    _as_datetime,
 )
 from export.excel_utils import (
-    write_table, add_heatmap, add_databar, add_iconset, add_dropdown, define_name, set_default_look
+    write_table, add_heatmap, add_databar, add_iconset, add_dropdown, define_name, set_default_look,
+    format_registry, HEATMAP_RULE, ICON_RULE
 )
-from export.links import naver_finance_url, dart_search_url
+from export.links import naver_finance_urls, dart_search_urls
 
 # 카테고리 상세 시트 최대 개수(너무 많으면 파일이 무거워짐)
 MAX_CATEGORY_SHEETS = 15
 
+# 입력별로 실제 사용하는 컬럼만 읽음(파케이 컬럼 프로젝션)
+FIN_COLUMNS = ["corp_code", "fiscal_year", "revenue", "op_income", "net_income"]
+EVT_COLUMNS = ["event_date", "corp_code", "event_type", "sub_type", "amount",
+               "counterparty", "summary", "report_nm", "rcept_dt"]
+MCAP_COLUMNS = ["corp_code", "date_ref", "mcap_krw"]
+DIM_COLUMNS = ["corp_code", "corp_name", "stock_code"]  # + gics_level
+
+# 시트별 컬럼 표시형식(시트마다 dict를 새로 만들지 않고 공유)
+INDUSTRY_FORMATS = {
+    "profit_rate": "0.00%",
+    "risk_rate": "0.00%",
+    "asset_acq_amt": "#,##0;[Red]-#,##0",
+    "mcap_top3_share": "0.00%",
+    "mcap_top5_share": "0.00%",
+    "mcap_top10_share": "0.00%",
+    "firms": "#,##0",
+    "risk_events": "#,##0",
+    "firm_count": "#,##0",
+    "total_mcap": "#,##0",
+}
+TOP100_FORMATS = {
+    "net_income": "#,##0;[Red]-#,##0",
+    "op_income": "#,##0;[Red]-#,##0",
+    "revenue": "#,##0",
+    "mcap_krw": "#,##0",
+    "share_in_category_pct": "0.00%",
+}
+CATEGORY_FORMATS = {
+    "revenue": "#,##0",
+    "op_income": "#,##0;[Red]-#,##0",
+    "net_income": "#,##0;[Red]-#,##0",
+    "_mcap": "#,##0",
+}
+EVENT_FORMATS = {"amount": "#,##0;[Red]-#,##0"}
+MACRO_FORMATS = {
+    "M2": "0.00",
+    "PolicyRate": "0.00",
+    "CPI": "0.00",
+    "IP": "0.00",
+    "ConstructionOrders": "#,##0",
+    "RetailSales": "#,##0",
+}
+
+# Industry_Overview 조건부서식 규칙(색상 변형은 여기서 한 번만 만듦)
+RISK_HEATMAP_RULE = {**HEATMAP_RULE, "min_color": "#F4CCCC", "max_color": "#76A5AF"}
+ASSET_HEATMAP_RULE = {**HEATMAP_RULE, "min_color": "#FFF2CC", "max_color": "#93C47D"}
+ARROWS_ICON_RULE = {**ICON_RULE, "icon_style": "3_arrows"}
+
+# 같은 프로세스에서 연도/레벨만 바꿔 재생성할 때 산업 지표 재계산을 건너뜀(입력 파일 mtime이 바뀌면 자동 무효)
+INDUSTRY_CACHE_SIZE = 8
+# 지표 계산 스레드 수: 서로 독립인 groupby/merge를 겹쳐서 실행(pandas 연산 상당 부분이 GIL을 놓음)
+METRIC_WORKERS = 4
+_industry_cache = OrderedDict()
+
 
 def _ensure_dir(path):
     d = os.path.dirname(path)
@@ -20,12 +82,123 @@ def _ensure_dir(path):
         os.makedirs(d, exist_ok=True)
 
 
-def _load_or_empty(p):
-    return pd.read_parquet(p) if os.path.exists(p) else pd.DataFrame()
+def _load_or_empty(p, columns=None, filters=None):
+    # 같은 (경로, mtime, 컬럼, 필터)면 메모리 캐시 재사용(파일이 바뀌면 mtime이 달라져 다시 읽음).
+    # 호출 측의 컬럼 추가/타입 변환이 캐시 원본에 번지지 않도록 얕은 복사본을 반환(데이터 버퍼는 공유)
+    df = _load_cached(p, _input_stamp(p),
+                      tuple(columns) if columns is not None else None,
+                      tuple(tuple(f) for f in filters) if filters else None)
+    return df.copy(deep=False)
+
+
+@functools.lru_cache(maxsize=16)
+def _load_cached(p, stamp, columns=None, filters=None):
+    # columns: 필요한 컬럼만 읽음(파일에 없는 컬럼은 조용히 제외 → 호출부에서 None 보정)
+    # filters: 파티션/통계 기반 pushdown(예: [("fiscal_year", "=", 2024)])
+    # pre_buffer: row group 단위로 읽기를 합쳐서(S3/NFS 등 고지연 스토리지에서 작은 read 다수 방지)
+    # self_destruct: 변환 직후 Arrow 버퍼를 해제해 로드 중 피크 메모리를 줄임
+    # 행이 0인 단일 파일은 footer(메타데이터)만 읽고 스키마로 타입이 있는 빈 프레임을 만듦(본문 읽기 생략)
+    if not os.path.exists(p):
+        return pd.DataFrame()
+    if os.path.isdir(p):
+        # 파티션 디렉터리(재무: fiscal_year=, 이벤트: year=/event_type=). 파일이 없으면 빈 프레임
+        dset = ds.dataset(p, format="parquet", partitioning="hive")
+        schema, empty = dset.schema, not dset.files
+    else:
+        meta = pq.read_metadata(p)
+        schema, empty = meta.schema.to_arrow_schema(), meta.num_rows == 0
+    if filters is not None:
+        filters = list(filters)
+    if columns is not None:
+        columns = [c for c in columns if c in schema.names]
+    if empty:
+        return schema.empty_table().select(columns if columns is not None else schema.names).to_pandas(date_as_object=False)
+    table = pq.read_table(p, columns=columns, filters=filters, pre_buffer=True, use_threads=True)
+    # date_as_object=False: date32(event_date/date_ref) → datetime64 컬럼(.dt 접근/비교가 벡터 연산)
+    return table.to_pandas(split_blocks=True, self_destruct=True, date_as_object=False)
+
+
+def _to_shared_category(frames, col):
+    """
+    여러 프레임의 같은 키 컬럼을 하나의 공통 category dtype으로 변환.
+    카테고리가 같아야 merge/groupby가 문자열 대신 정수 코드로 해시함(합집합이라 값 손실 없음).
+    """
+    present = [f for f in frames if col in f.columns]
+    if not present:
+        return
+    cats = pd.unique(pd.concat([f[col].astype(object) for f in present], ignore_index=True).dropna())
+    dtype = pd.CategoricalDtype(cats)
+    for f in present:
+        f[col] = f[col].astype(dtype)
+
 
+def _input_stamp(p):
+    """파일이면 mtime, 디렉터리(파티션 데이터셋)면 하위 파일 mtime 최댓값, 없으면 None."""
+    if not os.path.exists(p):
+        return None
+    if os.path.isdir(p):
+        return max((os.path.getmtime(os.path.join(d, f)) for d, _, files in os.walk(p) for f in files), default=None)
+    return os.path.getmtime(p)
 
-def _safe_str(x):
-    return "" if x is None else str(x)
+
+def _industry_metrics(stamps, df_fin, df_evt, df_dim, df_mcap, gics_level, focus_year):
+    """
+    산업(gics_level)별 지표 테이블. (입력 파일 stamp, 레벨, 연도)로 메모이즈.
+    DataFrame은 해시가 안 되므로 lru_cache 대신 키만 해시하는 작은 LRU를 씀.
+    반환 프레임은 캐시와 공유되므로 호출 측에서 수정하지 말 것.
+    """
+    key = (stamps, gics_level, focus_year)
+    if key in _industry_cache:
+        _industry_cache.move_to_end(key)
+        return _industry_cache[key]
+
+    # 네 지표는 입력을 읽기만 하고 서로 독립 → 스레드로 동시에 계산
+    # corp_code → 레벨 조회표는 한 번만 만들어 공유(지표마다 dim과 merge하지 않음)
+    lv = level_lookup(df_dim, gics_level)
+    with ThreadPoolExecutor(max_workers=METRIC_WORKERS) as ex:
+        futs = [
+            ex.submit(compute_profit_rate, df_fin, df_dim, gics_level, focus_year, level_map=lv),
+            ex.submit(compute_risk_rate, df_evt, df_dim, gics_level, focus_year, level_map=lv),
+            ex.submit(compute_asset_acq_amt, df_evt, df_dim, gics_level, focus_year, level_map=lv),
+            ex.submit(compute_topk_share, df_mcap, df_dim, gics_level, focus_year, ks=(3,5,10), level_map=lv),
+        ]
+        pr, rr, aa, tk = (f.result() for f in futs)
+
+    # 네 결과 모두 gics_level당 1행 → 키를 인덱스로 두고 한 번에 가로 결합(merge 3번 대신 인덱스 정렬 1번)
+    # reindex: 빠진 지표 컬럼은 NaN으로 채우고 출력 순서 고정
+    ind = (pd.concat([f.set_index(gics_level) for f in (pr, rr, aa, tk)], axis=1, join="outer")
+             .reindex(columns=["profit_rate","risk_rate","asset_acq_amt",
+                               "mcap_top3_share","mcap_top5_share","mcap_top10_share",
+                               "firms","risk_events","firm_count","total_mcap"])
+             .rename_axis(gics_level)
+             .reset_index())
+
+    _industry_cache[key] = ind
+    if len(_industry_cache) > INDUSTRY_CACHE_SIZE:
+        _industry_cache.popitem(last=False)
+    return ind
+
+
+def _category_frames(fin_year: pd.DataFrame, df_evt_recent: pd.DataFrame, gics_level: str):
+    """
+    카테고리 상세 시트용 [(카테고리, 기업 리스트, 최근 이벤트), ...] (기업 수 상위 MAX_CATEGORY_SHEETS개).
+    카테고리마다 전체 프레임에 == 마스크를 만들지 않고, groupby로 한 번 해시해 그룹을 꺼냄
+    (미분류는 "Unclassified" 그룹으로 묶음 → 해당 시트에도 기업/이벤트가 채워짐)
+    """
+    cat_key = fin_year[gics_level].astype(object).fillna("Unclassified")
+    cats = cat_key.value_counts().head(MAX_CATEGORY_SHEETS).index.tolist()
+    grp_fin = fin_year.groupby(cat_key, sort=False)
+    grp_evt = df_evt_recent.groupby(df_evt_recent[gics_level].astype(object).fillna("Unclassified"), sort=False)
+    evt_cats = set(grp_evt.groups)
+    out = []
+    for cat in cats:
+        sub = (grp_fin.get_group(cat)
+               .reindex(columns=["corp_name","stock_code","revenue","op_income","net_income","_mcap"])
+               .drop_duplicates(subset=["corp_name","stock_code"]))
+        sub_evt = (grp_evt.get_group(cat) if cat in evt_cats else df_evt_recent.iloc[:0]).reindex(
+            columns=["event_date","corp_name","event_type","sub_type","amount","counterparty","summary"])
+        out.append((cat, sub, sub_evt))
+    return out
 
 
 def build_excel_book(env: dict,
@@ -47,70 +220,81 @@ def build_excel_book(env: dict,
       - (옵션) 정렬지표별 Top100 시트 추가
     """
     _ensure_dir(out_path)
-    df_fin = _load_or_empty(fin_path)
-    df_evt = _load_or_empty(events_path)
-    df_dim = _load_or_empty(corp_path)
-    df_mcap = _load_or_empty(mcap_path)
-    df_macro = _load_or_empty(macro_path)
+    # 5개 파일 로드는 서로 독립적이므로 I/O를 겹쳐서 수행
+    with ThreadPoolExecutor(max_workers=5) as ex:
+        # 재무는 focus_year만 사용하므로 해당 연도 파티션만 읽음
+        f_fin = ex.submit(_load_or_empty, fin_path, FIN_COLUMNS, [("fiscal_year", "=", focus_year)])
+        f_evt = ex.submit(_load_or_empty, events_path, EVT_COLUMNS)
+        f_dim = ex.submit(_load_or_empty, corp_path, DIM_COLUMNS + [gics_level])
+        f_mcap = ex.submit(_load_or_empty, mcap_path, MCAP_COLUMNS)
+        f_macro = ex.submit(_load_or_empty, macro_path)  # 시트에 전체 컬럼을 그대로 출력
+    df_fin, df_evt, df_dim = f_fin.result(), f_evt.result(), f_dim.result()
+    df_mcap, df_macro = f_mcap.result(), f_macro.result()
+
+    # 조인 키/그룹 키를 category로: 반복되는 merge·groupby가 정수 코드 기반으로 동작, 메모리도 절감
+    _to_shared_category([df_fin, df_evt, df_dim, df_mcap], "corp_code")
+    _to_shared_category([df_dim], gics_level)
+    # 연도는 여기서 한 번만 계산 → 지표 함수/스냅샷 슬라이스가 날짜를 반복 파싱하지 않음
+    add_year_column(df_evt, "event_date")
+    add_year_column(df_mcap, "date_ref")
 
     # ---- Metrics 계산 ----
-    pr = compute_profit_rate(df_fin, df_dim, gics_level, focus_year)
-    rr = compute_risk_rate(df_evt, df_dim, gics_level, focus_year)
-    aa = compute_asset_acq_amt(df_evt, df_dim, gics_level, focus_year)
-    tk = compute_topk_share(df_mcap, df_dim, gics_level, focus_year, ks=(3,5,10))
-
-    ind = (pr.merge(rr, on=gics_level, how="outer")
-             .merge(aa, on=gics_level, how="outer")
-             .merge(tk, on=gics_level, how="outer"))
-
-    for col in ["profit_rate","risk_rate","asset_acq_amt","mcap_top3_share","mcap_top5_share","mcap_top10_share",
-                "firms","risk_events","firm_count","total_mcap"]:
-        if col not in ind.columns:
-            ind[col] = None
-
-    ind = ind[[gics_level,"profit_rate","risk_rate","asset_acq_amt",
-               "mcap_top3_share","mcap_top5_share","mcap_top10_share",
-               "firms","risk_events","firm_count","total_mcap"]].copy()
-
-    # Top100(기본: 순이익)
-    top100_base = compute_top100_companies(df_fin, df_mcap, df_dim, gics_level, focus_year,
-                                           sort_metric="net_income", topn=100)
-
-    # 하이퍼링크 컬럼 추가
-    if not top100_base.empty:
-        top100_base["네이버"] = top100_base["stock_code"].apply(lambda x: naver_finance_url(_safe_str(x)))
-        top100_base["DART검색"] = top100_base["corp_name"].apply(lambda x: dart_search_url(_safe_str(x)))
+    stamps = tuple((p, _input_stamp(p)) for p in (fin_path, events_path, corp_path, mcap_path))
+    ind = _industry_metrics(stamps, df_fin, df_evt, df_dim, df_mcap, gics_level, focus_year)
 
     # (옵션) 정렬지표별 Top100 시트에 쓰기 위해 준비
     sort_variants = ["net_income","op_income","revenue","mcap_krw","share_in_category_pct"] if also_emit_top100_variants else []
 
+    # Top100(기본: 순이익) + 정렬지표별 변형을 스레드로 동시에 계산(순이익 기준은 한 번만)
+    with ThreadPoolExecutor(max_workers=METRIC_WORKERS) as ex:
+        top100_futs = {m: ex.submit(compute_top100_companies, df_fin, df_mcap, df_dim, gics_level, focus_year,
+                                    sort_metric=m, topn=100)
+                       for m in dict.fromkeys(["net_income"] + sort_variants)}
+    top100_by_metric = {m: f.result() for m, f in top100_futs.items()}
+    top100_base = top100_by_metric["net_income"]
+
     # 카테고리별 상세 시트 데이터 준비
     # - 해당 카테고리 기업 리스트(Top100 기준 아님, 전체 기업)
     # - 최근 리스크 이벤트(해당 카테고리만, 최근 365일)
     # 기업 리스트 만들기 위해: 해당 연도 재무 + dim 결합
-    fin_year = df_fin[df_fin["fiscal_year"].astype(str)==str(focus_year)].copy()
+    # 정수 비교(fiscal_year는 int로 저장), 복사 없이 슬라이스 → 아래 merge가 새 프레임을 만듦
+    fin_year = df_fin.loc[df_fin["fiscal_year"].to_numpy() == int(focus_year)]
     fin_year = fin_year.merge(df_dim[["corp_code","corp_name","stock_code",gics_level]], on="corp_code", how="left")
     fin_year["_mcap"] = None
     if not df_mcap.empty:
-        snap = df_mcap.copy()
-        snap["y"] = pd.to_datetime(snap["date_ref"], errors="coerce").dt.year
-        snap = snap[snap["y"]==focus_year][["corp_code","mcap_krw"]]
+        snap = df_mcap.loc[df_mcap[YEAR_COL].to_numpy() == focus_year, ["corp_code","mcap_krw"]]
         fin_year = fin_year.merge(snap, on="corp_code", how="left")
         fin_year["_mcap"] = fin_year["mcap_krw"]
 
     # 리스크 이벤트 최근 365일
     if not df_evt.empty:
-        dts = pd.to_datetime(df_evt["event_date"], errors="coerce")
+        dts = _as_datetime(df_evt["event_date"])
         cutoff = pd.Timestamp(f"{focus_year}-12-31") - pd.Timedelta(days=365)
-        df_evt_recent = df_evt[(dts>=cutoff) & (dts<=pd.Timestamp(f"{focus_year}-12-31"))].copy()
+        df_evt_recent = df_evt[(dts>=cutoff) & (dts<=pd.Timestamp(f"{focus_year}-12-31"))]
         df_evt_recent = df_evt_recent.merge(df_dim[["corp_code","corp_name","stock_code",gics_level]], on="corp_code", how="left")
     else:
         df_evt_recent = pd.DataFrame(columns=["event_date","corp_code","event_type","sub_type","amount","counterparty","summary",gics_level,"corp_name","stock_code"])
 
+    # 카테고리 상세 시트 데이터는 백그라운드 스레드에서 미리 준비 → 앞쪽 시트를 쓰는 동안 겹쳐서 계산
+    # (XlsxWriter 워크북은 스레드 안전하지 않으므로 시트 쓰기 자체는 메인 스레드에서 순서대로)
+    f_cats = None
+    if make_category_sheets and not fin_year.empty:
+        prep = ThreadPoolExecutor(max_workers=1)
+        f_cats = prep.submit(_category_frames, fin_year, df_evt_recent, gics_level)
+        prep.shutdown(wait=False)
+
     # ---- 엑셀 쓰기 ----
-    with pd.ExcelWriter(out_path, engine="xlsxwriter") as xw:
+    # constant_memory: 행을 다 쓰면 임시파일로 내보내 메모리를 행 하나 분량으로 유지.
+    # 대신 시트마다 행을 위→아래 순서로만 써야 함(지나간 행에 쓴 값은 무시됨) → 아래 쓰기 순서 주의
+    # strings_to_urls=False: 링크는 write_url로 명시적으로만 기록(문자열 셀마다 URL 정규식 검사 생략)
+    with pd.ExcelWriter(out_path, engine="xlsxwriter",
+                        engine_kwargs={"options": {"constant_memory": True,
+                                                   "strings_to_urls": False,
+                                                   "default_date_format": "yyyy-mm-dd"}}) as xw:
         wb = xw.book
         F = set_default_look(wb)
+        # 표시형식은 워크북 전체에서 한 벌만 생성(시트/컬럼마다 add_format 하지 않음)
+        fmt = format_registry(wb)
 
         # =========================
         # 1) Dashboard_Combined
@@ -119,34 +303,39 @@ def build_excel_book(env: dict,
         dash.hide_gridlines(2)
         dash.set_column(0, 0, 26)
         dash.set_column(2, 2, 24)
+        # KPI 카드: (라벨, 값, 서식)을 미리 확정 → 쓰기 루프에서 문자열 검사 없음
+        kpis = [
+            ("Avg Profit Rate", ind["profit_rate"].mean(skipna=True) if not ind.empty else None, F["pct"]),
+            ("Avg Risk Rate", ind["risk_rate"].mean(skipna=True) if not ind.empty else None, F["pct"]),
+            ("Sum Asset Acq Amt", ind["asset_acq_amt"].sum(skipna=True) if not ind.empty else None, F["krw"]),
+            ("Avg Top10 Share", ind["mcap_top10_share"].mean(skipna=True) if not ind.empty else None, F["pct"]),
+            ("FocusYear", focus_year, F["int"]),
+        ]
+        metric_options = ["profit_rate","risk_rate","asset_acq_amt","mcap_top3_share","mcap_top10_share"]
+        sort_options = ["net_income","op_income","revenue","mcap_krw","share_in_category_pct"]
+        controls = [
+            ("Year", focus_year, F["int"]),
+            ("GICS Level", gics_level, None),
+            ("Metric (for Chart)", metric_options[0], None),
+            ("Top100 Sort Metric", sort_options[0], None),
+        ]
+        # constant_memory: 한 행의 셀(Controls + KPI)을 모두 쓴 뒤 다음 행으로 진행
         dash.write(0, 0, "Controls", F["title"])
-        dash.write(2, 0, "Year", F["header"]); dash.write(2, 2, focus_year, F["int"])
-        dash.write(3, 0, "GICS Level", F["header"]); dash.write(3, 2, gics_level)
-        dash.write(4, 0, "Metric (for Chart)", F["header"]); dash.write(4, 2, "profit_rate")
-        add_dropdown(dash, 4, 2, 4, 2, ["profit_rate","risk_rate","asset_acq_amt","mcap_top3_share","mcap_top10_share"])
-        dash.write(5, 0, "Top100 Sort Metric", F["header"]); dash.write(5, 2, "net_income")
-        add_dropdown(dash, 5, 2, 5, 2, ["net_income","op_income","revenue","mcap_krw","share_in_category_pct"])
-        dash.write(7, 0, "Notes", F["header"])
-        dash.write(8, 0, "• 드롭다운으로 차트/Top100 정렬지표를 바꿔보세요.", F["subtle"])
-        dash.write(9, 0, "• 인더스트리 시트는 히트맵/데이터바/아이콘으로 가독성을 높였습니다.", F["subtle"])
-
-        # KPI 카드
-        kpi_df = pd.DataFrame({
-            "Metric": ["Avg Profit Rate","Avg Risk Rate","Sum Asset Acq Amt","Avg Top10 Share","FocusYear"],
-            "Value": [
-                ind["profit_rate"].mean(skipna=True) if not ind.empty else None,
-                ind["risk_rate"].mean(skipna=True) if not ind.empty else None,
-                ind["asset_acq_amt"].sum(skipna=True) if not ind.empty else None,
-                ind["mcap_top10_share"].mean(skipna=True) if not ind.empty else None,
-                focus_year
-            ]
-        })
-        # KPI 출력
         dash.write(0, 6, "KPIs", F["title"])
-        for i, row in enumerate(kpi_df.itertuples(index=False), start=2):
-            dash.write(i, 6, row.Metric, F["header"])
-            fmt = F["pct"] if "Rate" in row.Metric or "Share" in row.Metric else (F["krw"] if "Amt" in row.Metric else F["int"])
-            dash.write(i, 8, row.Value, fmt)
+        for i, (metric, kvalue, kfmt) in enumerate(kpis, start=2):
+            if i - 2 < len(controls):
+                label, value, vfmt = controls[i - 2]
+                dash.write(i, 0, label, F["header"]); dash.write(i, 2, value, vfmt)
+            dash.write(i, 6, metric, F["header"])
+            dash.write(i, 8, None if pd.isna(kvalue) else kvalue, kfmt)  # 빈 지표(NaN)는 빈 셀
+        add_dropdown(dash, 4, 2, 4, 2, metric_options)
+        add_dropdown(dash, 5, 2, 5, 2, sort_options)
+        # Notes는 A열만 쓰는 연속 행이라 한 번에(행 순서도 유지됨)
+        dash.write(7, 0, "Notes", F["header"])
+        dash.write_column(8, 0, [
+            "• 드롭다운으로 차트/Top100 정렬지표를 바꿔보세요.",
+            "• 인더스트리 시트는 히트맵/데이터바/아이콘으로 가독성을 높였습니다.",
+        ], F["subtle"])
 
         # 동적 이름 정의(5단계와 유사)
         # Industry_Overview 시트 작성 후 차트에서 참조
@@ -159,28 +348,16 @@ def build_excel_book(env: dict,
         ws2.hide_gridlines(2)
         ws2.write(0, 0, f"Industry Overview ({gics_level}, {focus_year})", F["title"])
 
-        number_formats = {
-            "profit_rate": "0.00%",
-            "risk_rate": "0.00%",
-            "asset_acq_amt": "#,##0;[Red]-#,##0",
-            "mcap_top3_share": "0.00%",
-            "mcap_top5_share": "0.00%",
-            "mcap_top10_share": "0.00%",
-            "firms": "#,##0",
-            "risk_events": "#,##0",
-            "firm_count": "#,##0",
-            "total_mcap": "#,##0"
-        }
         write_table(xw, "Industry_Overview", ind, start_row=1, start_col=0,
-                    header_format=F["header"], number_formats=number_formats)
+                    header_format=F["header"], fmt=fmt, number_formats=INDUSTRY_FORMATS)
 
         nrows = max(1, len(ind.index))
         # 히트맵/데이터바/아이콘셋
         add_heatmap(ws2, 2, 1, 1 + nrows, 1)  # Profit
-        add_heatmap(ws2, 2, 2, 1 + nrows, 2, min_color="#F4CCCC", max_color="#76A5AF")  # Risk
-        add_heatmap(ws2, 2, 3, 1 + nrows, 3, min_color="#FFF2CC", max_color="#93C47D")  # Asset
+        add_heatmap(ws2, 2, 2, 1 + nrows, 2, RISK_HEATMAP_RULE)  # Risk
+        add_heatmap(ws2, 2, 3, 1 + nrows, 3, ASSET_HEATMAP_RULE)  # Asset
         add_databar(ws2, 2, 6, 1 + nrows, 6)  # Top10 share
-        add_iconset(ws2, 2, 8, 1 + nrows, 8, icon_style="3_arrows")  # risk_events
+        add_iconset(ws2, 2, 8, 1 + nrows, 8, ARROWS_ICON_RULE)  # risk_events
 
         # 동적 이름(대시보드 차트용)
         define_name(wb, "IndCat", f"=Industry_Overview!$A$2:INDEX(Industry_Overview!$A:$A, COUNTA(Industry_Overview!$A:$A))")
@@ -232,57 +409,28 @@ def build_excel_book(env: dict,
         ws3 = wb.add_worksheet("Top100_Companies")
         ws3.hide_gridlines(2)
         ws3.write(0, 0, f"Top 100 Companies ({gics_level}, {focus_year})", F["title"])
-        # 링크 컬럼 가공
-        out_top = top100_base.copy()
-        if not out_top.empty:
-            # 하이퍼링크 표시 컬럼
-            out_top.insert(out_top.columns.get_loc("corp_name")+1, "NAVER", "")
-            out_top.insert(out_top.columns.get_loc("corp_name")+2, "DART", "")
-            # 나머지는 테이블로 출력한 뒤 하이퍼링크를 셀에 주입
-        write_table(xw, "Top100_Companies", out_top, start_row=2, start_col=0,
-                    header_format=F["header"],
-                    number_formats={
-                        "net_income": "#,##0;[Red]-#,##0",
-                        "op_income": "#,##0;[Red]-#,##0",
-                        "revenue": "#,##0",
-                        "mcap_krw": "#,##0",
-                        "share_in_category_pct": "0.00%"
-                    })
-
-        # 하이퍼링크 삽입
+        # 하이퍼링크: 자리표시 컬럼 없이 표 오른쪽에 NAVER/DART 컬럼으로, write_table이 해당 행을 쓸 때 함께 기록
+        links = None
         if not top100_base.empty:
-            headers = out_top.columns.tolist()
-            r0 = 3  # 데이터 시작 행(0-index 기반)
-            c_name = headers.index("corp_name")
-            c_nav  = headers.index("NAVER")
-            c_dt   = headers.index("DART")
-            for i, row in enumerate(top100_base.itertuples(index=False), start=0):
-                # NAVER
-                url_n = naver_finance_url(getattr(row, "stock_code"))
-                if url_n:
-                    ws3.write_url(r0 + i, c_nav, url_n, string="열기")
-                # DART
-                url_d = dart_search_url(getattr(row, "corp_name"))
-                if url_d:
-                    ws3.write_url(r0 + i, c_dt, url_d, string="검색")
+            links = {
+                "NAVER": (naver_finance_urls(top100_base["stock_code"]).tolist(), "열기"),
+                "DART": (dart_search_urls(top100_base["corp_name"]).tolist(), "검색"),
+            }
+        write_table(xw, "Top100_Companies", top100_base, start_row=2, start_col=0,
+                    header_format=F["header"], fmt=fmt,
+                    number_formats=TOP100_FORMATS,
+                    link_columns=links)
 
         # (옵션) 정렬지표별 Top100 시트 동시 생성
         if also_emit_top100_variants and not df_fin.empty:
             for metric in sort_variants:
-                tdf = compute_top100_companies(df_fin, df_mcap, df_dim, gics_level, focus_year,
-                                               sort_metric=metric, topn=100)
+                tdf = top100_by_metric[metric]
                 sh = wb.add_worksheet(f"Top100_{metric}")
                 sh.hide_gridlines(2)
                 sh.write(0, 0, f"Top 100 by {metric} ({gics_level}, {focus_year})", F["title"])
                 write_table(xw, f"Top100_{metric}", tdf, start_row=2, start_col=0,
-                            header_format=F["header"],
-                            number_formats={
-                                "net_income": "#,##0;[Red]-#,##0",
-                                "op_income": "#,##0;[Red]-#,##0",
-                                "revenue": "#,##0",
-                                "mcap_krw": "#,##0",
-                                "share_in_category_pct": "0.00%"
-                            })
+                            header_format=F["header"], fmt=fmt,
+                            number_formats=TOP100_FORMATS)
 
         # =========================
         # 5) Risk_Events / Asset_Transactions / Macro_Panel
@@ -293,22 +441,19 @@ def build_excel_book(env: dict,
         if df_evt.empty:
             df_evt_out = pd.DataFrame(columns=["event_date","corp_code","event_type","sub_type","amount","counterparty","summary","report_nm","rcept_dt"])
         else:
-            keep = ["event_date","corp_code","event_type","sub_type","amount","counterparty","summary","report_nm","rcept_dt"]
-            for c in keep:
-                if c not in df_evt.columns:
-                    df_evt[c] = None
-            df_evt_out = df_evt[keep].copy()
+            # reindex: 없는 컬럼은 빈 값으로 채운 새 프레임(원본 df_evt는 건드리지 않음)
+            df_evt_out = df_evt.reindex(columns=["event_date","corp_code","event_type","sub_type","amount","counterparty","summary","report_nm","rcept_dt"])
         write_table(xw, evt_name, df_evt_out, start_row=0, start_col=0,
-                    header_format=F["header"],
-                    number_formats={"amount": "#,##0;[Red]-#,##0"})
+                    header_format=F["header"], fmt=fmt,
+                    number_formats=EVENT_FORMATS)
 
         at_name = "Asset_Transactions"
         ws5 = wb.add_worksheet(at_name)
         ws5.hide_gridlines(2)
         df_at = df_evt_out[df_evt_out["event_type"].isin(["ASSET_ACQ","BIZ_ACQ","EQUITY_ACQ","ASSET_DISP","BIZ_DISP","EQUITY_DISP"])] if not df_evt_out.empty else pd.DataFrame(columns=df_evt_out.columns)
         write_table(xw, at_name, df_at, start_row=0, start_col=0,
-                    header_format=F["header"],
-                    number_formats={"amount": "#,##0;[Red]-#,##0"})
+                    header_format=F["header"], fmt=fmt,
+                    number_formats=EVENT_FORMATS)
 
         macro_name = "Macro_Panel"
         ws6 = wb.add_worksheet(macro_name)
@@ -316,48 +461,29 @@ def build_excel_book(env: dict,
         if df_macro.empty:
             df_macro = pd.DataFrame(columns=["date","M2","PolicyRate","CPI","IP","ConstructionOrders","RetailSales"])
         write_table(xw, macro_name, df_macro, start_row=0, start_col=0,
-                    header_format=F["header"],
-                    number_formats={
-                        "M2": "0.00",
-                        "PolicyRate": "0.00",
-                        "CPI": "0.00",
-                        "IP": "0.00",
-                        "ConstructionOrders": "#,##0",
-                        "RetailSales": "#,##0"
-                    })
+                    header_format=F["header"], fmt=fmt,
+                    number_formats=MACRO_FORMATS)
 
         # =========================
         # 6) (옵션) GICS 카테고리 상세 시트
         # =========================
-        if make_category_sheets and not fin_year.empty:
-            cats = fin_year[gics_level].fillna("Unclassified").value_counts().head(MAX_CATEGORY_SHEETS).index.tolist()
-            for cat in cats:
+        if f_cats is not None:
+            for cat, sub, sub_evt in f_cats.result():
                 shn = f"Cat_{str(cat)[:24]}"
                 sh = wb.add_worksheet(shn)
                 sh.hide_gridlines(2)
                 sh.write(0, 0, f"{gics_level} : {cat}", F["title"])
                 # 기업 리스트(해당 카테고리)
-                sub = fin_year[(fin_year[gics_level]==cat)].copy()
-                cols = ["corp_name","stock_code","revenue","op_income","net_income","_mcap"]
-                for c in cols:
-                    if c not in sub.columns: sub[c] = None
-                sub = sub[cols].drop_duplicates(subset=["corp_name","stock_code"])
                 write_table(xw, shn, sub, start_row=2, start_col=0,
-                            header_format=F["header"],
-                            number_formats={
-                                "revenue": "#,##0",
-                                "op_income": "#,##0;[Red]-#,##0",
-                                "net_income": "#,##0;[Red]-#,##0",
-                                "_mcap": "#,##0"
-                            })
+                            header_format=F["header"], fmt=fmt,
+                            number_formats=CATEGORY_FORMATS)
                 # 최근 리스크 이벤트(하단)
-                sub_evt = df_evt_recent[df_evt_recent[gics_level]==cat].copy()
-                keep2 = ["event_date","corp_name","event_type","sub_type","amount","counterparty","summary"]
-                for c in keep2:
-                    if c not in sub_evt.columns: sub_evt[c] = None
-                write_table(xw, shn, sub_evt[keep2], start_row=4+len(sub)+2, start_col=0,
-                            header_format=F["header"],
-                            number_formats={"amount": "#,##0;[Red]-#,##0"})
+                # constant_memory: 소제목 행을 먼저 쓰고 그 아래에 표
+                # 이 모드에서는 add_table 대신 autofilter를 쓰는데 시트당 autofilter는 하나뿐
+                # → 이벤트 표에는 필터를 걸지 않아 위쪽 기업 리스트의 필터를 유지(이벤트 표는 필터 없음)
                 sh.write(4+len(sub)+1, 0, "최근 리스크 이벤트(지난 1년)", F["header"])
+                write_table(xw, shn, sub_evt, start_row=4+len(sub)+2, start_col=0,
+                            header_format=F["header"], fmt=fmt,
+                            number_formats=EVENT_FORMATS, autofilter=False)
 
     print(f"[OK] Excel book written: {out_path}")
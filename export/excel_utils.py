@@ -1,67 +1,111 @@
-from typing import List, Optional, Dict
+import weakref
+from typing import Callable, List, Optional, Dict, Sequence, Tuple
 import pandas as pd
 
 
+def _column_writers(ws, df: pd.DataFrame) -> List[Callable]:
+    """컬럼별 셀 writer: bool/숫자/날짜/문자열 전용 메서드, 섞여 있으면 일반 write."""
+    writers = []
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):  # category는 값 dtype(categories) 기준
+            s = s.cat.categories.to_series()
+        dtype = s.dtype
+        if pd.api.types.is_bool_dtype(dtype):
+            writers.append(ws.write_boolean)
+        elif pd.api.types.is_numeric_dtype(dtype):
+            writers.append(ws.write_number)
+        elif pd.api.types.is_datetime64_dtype(dtype):
+            writers.append(ws.write_datetime)
+        elif pd.api.types.infer_dtype(s, skipna=True) in ("string", "empty"):
+            # write_string: "="로 시작하는 텍스트도 수식이 아니라 문자열로 기록
+            writers.append(ws.write_string)
+        else:
+            writers.append(ws.write)
+    return writers
+
+
 def write_table(xw, sheet_name: str, df: pd.DataFrame, start_row=0, start_col=0,
                 header_format=None, number_formats: Optional[Dict[str, str]] = None,
-                autofilter=True, freeze_panes=True, table_style="Table Style Medium 9"):
+                autofilter=True, freeze_panes=True, table_style="Table Style Medium 9",
+                link_columns: Optional[Dict[str, Tuple[Sequence[str], str]]] = None,
+                fmt: Optional[Callable[[str], object]] = None):
     """
     DataFrame -> Excel Table
     - number_formats: {"colname": "#,##0;[Red]-#,##0", "colname2": "0.00%"} 처럼 컬럼별 표시형식
+    - fmt: num_format 문자열 → Format 조회 함수(기본: 워크북 공용 format_registry)
+    - link_columns: {"헤더": (url 목록, "표시문자열")} 처럼 주면 표 오른쪽에 하이퍼링크 컬럼을 덧붙여 기록
+      (df에 자리표시 컬럼을 만들지 않음, 빈 url은 건너뜀)
+    - 헤더 → 본문을 행 단위로 위에서 아래로 기록(Workbook constant_memory 모드 호환).
+      constant_memory 모드에서는 이미 지나간 행에 쓴 값이 무시되므로, 같은 시트의 다른 셀도 호출 측에서 행 순서를 지킬 것.
+      또한 이 모드에서 XlsxWriter는 add_table을 지원하지 않으므로 autofilter만 걸고 테이블 스타일은 생략.
     """
     ws = xw.sheets[sheet_name]
     ws.hide_gridlines(2)  # both
+    fmt = fmt or format_registry(xw.book)
     nrows, ncols = len(df.index), len(df.columns)
-
-    # 본문 먼저 쓰기
-    ws.write_row(start_row, start_col, df.columns.tolist(), header_format)
-    if nrows:
-        ws.write_column(start_row + 1, start_col, df.iloc[:, 0].tolist())
-        for j in range(1, ncols):
-            ws.write_column(start_row + 1, start_col + j, df.iloc[:, j].tolist())
-
-    # 테이블 생성
     end_row, end_col = start_row + nrows, start_col + ncols - 1
-    ws.add_table(start_row, start_col, end_row, end_col, {
-        "style": table_style,
-        "columns": [{"header": c} for c in df.columns],
-        "autofilter": autofilter,
-    })
-    # 숫자 서식
-    if number_formats:
-        for j, col in enumerate(df.columns):
-            fmt = number_formats.get(col)
-            if fmt:
-                rng = (start_row + 1, start_col + j, end_row, start_col + j)
-                ws.set_column(rng[1], rng[3], 14, xw.book.add_format({"num_format": fmt}))
-    # 폭 자동 (헤더 길이에 기반해 대략)
+
+    # 숫자 서식 + 폭 (헤더 길이에 기반해 대략). set_column은 행 기록 순서와 무관
     for j, col in enumerate(df.columns):
         width = max(12, min(42, int(max(len(str(col)), 16))))
-        ws.set_column(start_col + j, start_col + j, width)
+        nf = (number_formats or {}).get(col)
+        ws.set_column(start_col + j, start_col + j, width, fmt(nf) if nf else None)
+
+    # 링크 컬럼: 표 바로 오른쪽(헤더는 표 헤더와 같은 행)
+    links = [(end_col + 1 + k, list(urls), text) for k, (urls, text) in enumerate((link_columns or {}).values())]
+    for c, _, _ in links:
+        ws.set_column(c, c, 10)
+
+    # 본문: 행 단위 스트리밍. XlsxWriter는 NaN/NaT를 쓸 수 없으므로 결측은 None(빈 셀, 건너뜀)으로
+    ws.write_row(start_row, start_col, df.columns.tolist() + list(link_columns or {}), header_format)
+    body = df.astype(object).where(df.notna(), None)
+    # 컬럼 dtype별 전용 writer를 미리 골라 둠(셀마다 write()의 isinstance 분기 생략)
+    cols = [(start_col + j, w) for j, w in enumerate(_column_writers(ws, df))]
+    write_url = ws.write_url
+    for i, values in enumerate(body.itertuples(index=False, name=None)):
+        r = start_row + 1 + i
+        for (c, w), v in zip(cols, values):
+            if v is not None:
+                w(r, c, v)
+        for c, urls, text in links:
+            url = urls[i]
+            if url:
+                write_url(r, c, url, string=text)
+
+    # 테이블 생성: 링크 컬럼까지 범위에 포함 → 필터 드롭다운으로 정렬해도 링크가 같은 행과 함께 움직임
+    last_col = end_col + len(links)
+    if getattr(ws, "constant_memory", False):
+        if autofilter:
+            ws.autofilter(start_row, start_col, end_row, last_col)
+    else:
+        ws.add_table(start_row, start_col, end_row, last_col, {
+            "style": table_style,
+            "columns": [{"header": c} for c in list(df.columns) + list(link_columns or {})],
+            "autofilter": autofilter,
+        })
 
     if freeze_panes:
         ws.freeze_panes(start_row + 1, start_col + 1)
 
 
-def add_heatmap(ws, first_row, first_col, last_row, last_col, min_color="#FFF2CC", max_color="#63BE7B"):
-    ws.conditional_format(first_row, first_col, last_row, last_col, {
-        "type": "2_color_scale",
-        "min_color": min_color,
-        "max_color": max_color
-    })
+# 조건부서식 규칙 템플릿(모듈 상수로 한 번만 정의하고 범위 좌표만 바꿔 적용).
+# XlsxWriter는 conditional_format 안에서 options를 복사해 쓰므로 같은 dict를 여러 범위에 공유해도 안전.
+HEATMAP_RULE = {"type": "2_color_scale", "min_color": "#FFF2CC", "max_color": "#63BE7B"}
+DATABAR_RULE = {"type": "data_bar"}
+ICON_RULE = {"type": "icon_set", "icon_style": "3_traffic_lights"}
 
 
-def add_databar(ws, first_row, first_col, last_row, last_col):
-    ws.conditional_format(first_row, first_col, last_row, last_col, {
-        "type": "data_bar"
-    })
+def add_heatmap(ws, first_row, first_col, last_row, last_col, rule=HEATMAP_RULE):
+    ws.conditional_format(first_row, first_col, last_row, last_col, rule)
 
 
-def add_iconset(ws, first_row, first_col, last_row, last_col, icon_style="3_traffic_lights"):
-    ws.conditional_format(first_row, first_col, last_row, last_col, {
-        "type": "icon_set",
-        "icon_style": icon_style
-    })
+def add_databar(ws, first_row, first_col, last_row, last_col, rule=DATABAR_RULE):
+    ws.conditional_format(first_row, first_col, last_row, last_col, rule)
+
+
+def add_iconset(ws, first_row, first_col, last_row, last_col, rule=ICON_RULE):
+    ws.conditional_format(first_row, first_col, last_row, last_col, rule)
 
 
 def add_dropdown(ws, first_row, first_col, last_row, last_col, options: List[str]):
@@ -76,6 +120,29 @@ def define_name(wb, name: str, formula: str):
     wb.define_name(f"{name}={formula}")
 
 
+# 워크북별 {num_format: Format} 캐시(워크북이 사라지면 같이 정리)
+_FORMAT_CACHES = weakref.WeakKeyDictionary()
+
+
+def format_registry(wb, seed: Optional[Dict[str, object]] = None):
+    """
+    num_format 문자열별 Format을 워크북당 한 번만 생성해 재사용하는 조회 함수를 반환.
+    같은 표시형식의 XF 레코드가 중복 생성되지 않아 파일이 작아지고 저장(close)도 빨라짐.
+    캐시는 워크북 단위라 여러 번 호출해도(write_table 기본값 포함) 같은 Format을 공유.
+    seed: 이미 만든 Format 등록(예: set_default_look의 pct/int/krw)
+    """
+    cache = _FORMAT_CACHES.setdefault(wb, {})
+    for nf, f in (seed or {}).items():
+        cache.setdefault(nf, f)
+
+    def fmt(num_format: str):
+        f = cache.get(num_format)
+        if f is None:
+            f = cache[num_format] = wb.add_format({"num_format": num_format})
+        return f
+    return fmt
+
+
 def set_default_look(wb, *, base_font="맑은 고딕", base_size=10):
     """
     XlsxWriter는 워크북 전역 폰트 설정이 제한적이라, 자주 쓰는 포맷만 생성해서 재사용.
@@ -89,4 +156,6 @@ def set_default_look(wb, *, base_font="맑은 고딕", base_size=10):
         "krw": wb.add_format({"num_format": "#,##0;[Red]-#,##0"}),
         "small": wb.add_format({"font_size": 9, "italic": True, "font_color": "#777777"}),
     }
+    # 같은 표시형식의 컬럼 서식은 새로 만들지 않고 이 Format을 재사용하도록 등록
+    format_registry(wb, seed={"0.00%": fmts["pct"], "#,##0": fmts["int"], "#,##0;[Red]-#,##0": fmts["krw"]})
     return fmts
@@ -1,11 +1,19 @@
+from urllib.parse import quote
+
+import pandas as pd
+
+NAVER_ITEM_URL = "https://finance.naver.com/item/main.naver?code="
+DART_SEARCH_URL = "https://dart.fss.or.kr/dsac001/search.ax?textCrpNm="
+
+
 def naver_finance_url(stock_code: str) -> str:
     """
     네이버 금융 종목 상세 링크(국내 6자리 종목코드 기준).
     """
+    # stock_code는 corp_master 수집 시 6자리로 정규화되어 있음
     if not stock_code:
         return ""
-    code = str(stock_code).zfill(6)
-    return f"https://finance.naver.com/item/main.naver?code={code}"
+    return NAVER_ITEM_URL + str(stock_code)
 
 
 def dart_search_url(corp_name: str) -> str:
@@ -14,6 +22,22 @@ def dart_search_url(corp_name: str) -> str:
     """
     if not corp_name:
         return ""
-    from urllib.parse import quote
     q = quote(corp_name)
-    return f"https://dart.fss.or.kr/dsac001/search.ax?textCrpNm={q}"
+    return f"{DART_SEARCH_URL}{q}"
+
+
+def _as_str(s: pd.Series) -> pd.Series:
+    # 결측(None/NaN) → "" (category여도 동작)
+    return s.astype(object).fillna("").astype(str)
+
+
+def naver_finance_urls(stock_codes: pd.Series) -> pd.Series:
+    """naver_finance_url의 Series 버전(접두어 결합을 컬럼 단위로). 빈 코드는 ""."""
+    codes = _as_str(stock_codes)
+    return (NAVER_ITEM_URL + codes).where(codes != "", "")
+
+
+def dart_search_urls(corp_names: pd.Series) -> pd.Series:
+    """dart_search_url의 Series 버전. 빈 회사명은 ""."""
+    names = _as_str(corp_names)
+    return (DART_SEARCH_URL + names.map(quote)).where(names != "", "")
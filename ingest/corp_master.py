@@ -1,28 +1,53 @@
 import io, zipfile, xml.etree.ElementTree as ET, os
-import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from common.dart_client import DartClient
 
+CORP_FIELDS = ("corp_code", "corp_name", "stock_code", "modify_date")
+
+# 출력 스키마 고정(pandas 타입 추론 없이 저장). corp_code는 회사별 고유값이라 dictionary 타입 대신 string,
+# stock_code는 비상장(공백)이 대부분이라 파케이 dictionary 인코딩으로 파일 크기를 줄임
+SCHEMA = pa.schema([
+    ("corp_code", pa.string()),
+    ("corp_name", pa.string()),
+    ("stock_code", pa.string()),
+    ("modify_date", pa.date32()),
+    ("is_listed", pa.bool_()),
+])
+
 def fetch_and_save_corp_master(env: dict, out_path: str):
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    client = DartClient(env["DART_API_KEY"])
-    blob = client.get_corp_code_zip()
+    with DartClient(env["DART_API_KEY"]) as client:
+        blob = client.get_corp_code_zip()
 
+    # 컬럼별 리스트에 바로 누적(행마다 dict를 만들지 않음)
+    cols = {k: [] for k in CORP_FIELDS}
     with zipfile.ZipFile(io.BytesIO(blob)) as zf:
         # The XML file is usually named CORPCODE.xml inside.
         xml_name = [n for n in zf.namelist() if n.lower().endswith(".xml")][0]
-        xml_bytes = zf.read(xml_name)
-    root = ET.fromstring(xml_bytes)
-
-    rows = []
-    for el in root.findall("list"):
-        rows.append({
-            "corp_code": el.findtext("corp_code"),
-            "corp_name": el.findtext("corp_name"),
-            "stock_code": el.findtext("stock_code"),
-            "modify_date": el.findtext("modify_date"),
-        })
-    df = pd.DataFrame(rows)
-    # Derive simple flags
-    df["is_listed"] = df["stock_code"].notna() & (df["stock_code"].str.len() > 0)
-    df.to_parquet(out_path, index=False)
-    print(f"[OK] corp_master saved: {out_path}, rows={len(df)}")
+        # iterparse로 zip 안의 XML을 스트리밍: <list>를 하나 처리할 때마다 clear → 전체 DOM을 메모리에 올리지 않음
+        with zf.open(xml_name) as fh:
+            for _, el in ET.iterparse(fh, events=("end",)):
+                if el.tag != "list":
+                    continue
+                for k in CORP_FIELDS:
+                    cols[k].append(el.findtext(k))
+                el.clear()
+    # stock_code 정규화는 여기서 한 번만: 공백 제거, 상장사는 6자리 0채움, 비상장(공백/누락)은 ""
+    # → 하류(링크 생성/시총 대상 선정)에서 zfill/strip 반복 불필요
+    raw = pc.fill_null(pc.utf8_trim_whitespace(pa.array(cols["stock_code"], pa.string())), "")
+    listed = pc.greater(pc.utf8_length(raw), 0)
+    stock = pc.if_else(listed, pc.utf8_lpad(raw, width=6, padding="0"), "")
+    table = pa.table({
+        "corp_code": pa.array(cols["corp_code"], pa.string()),
+        "corp_name": pa.array(cols["corp_name"], pa.string()),
+        "stock_code": stock,
+        # YYYYMMDD → date32 (형식이 어긋나면 null)
+        "modify_date": pc.strptime(pa.array(cols["modify_date"], pa.string()), format="%Y%m%d",
+                                   unit="s", error_is_null=True).cast(pa.date32()),
+        # Derive simple flags
+        "is_listed": listed,
+    }, schema=SCHEMA)
+    pq.write_table(table, out_path, compression="zstd", compression_level=3, use_dictionary=["stock_code"])
+    print(f"[OK] corp_master saved: {out_path}, rows={table.num_rows}")
@@ -1,10 +1,19 @@
 import os
 import math
-import time
+import re
+import shutil
 import datetime as dt
-from typing import Dict, List, Optional, Tuple
+from collections import defaultdict
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 from common.dart_client import DartClient
 
@@ -12,15 +21,44 @@ from common.dart_client import DartClient
 # 설정(필요시 조정)
 # ---------------------------------------
 PAGE_COUNT = 100
-SLEEP_SEC = 0.15
-CHECKPOINT_EVERY = 5000  # N건마다 중간 저장
+SLEEP_SEC = 0.15        # 재시도 백오프 기준 간격(요청률 제한은 DartClient 토큰 버킷)
+ROW_GROUP_SIZE = 50_000  # N건 모일 때마다 파티션 파일로 기록(중간 저장 겸용)
 WINDOW_DAYS = 90         # DART list 조회 기간 분할(권장 3개월 단위)
+TASK_BATCH = 256         # 한 번에 동시 요청할 (회사, 윈도우)/페이지 작업 수(작업 목록 전체를 메모리에 만들지 않음)
+# 회사 수가 이 이상이면 회사별 조회 대신 윈도우별 전체 공시를 받아 회사 집합으로 필터
+# (회사 × 윈도우 호출 수가 윈도우당 페이지 수보다 훨씬 많아짐). 회사 코드 없는 list 조회는 최대 3개월 → WINDOW_DAYS 이하
+WINDOW_SCAN_MIN_CORPS = 500
+# 윈도우 스캔 시 조회할 공시유형: B=주요사항보고, I=거래소공시(부도/소송/영업정지 등), C=발행공시(합병/분할 증권신고서)
+# 회사별 조회는 (회사, 윈도우)당 유형 구분 없이 한 번만 호출(호출 수 유지) → 두 방식의 차이는
+# 이 세 유형 밖의 공시에서 EVENT_RULES에 걸리는 소수 보고서를 회사별 조회만 더 받는다는 점뿐
+PBLNTF_TYPES = ("B", "I", "C")
+MAX_WORKERS = 8          # 동시 요청 스레드 수(DartClient 커넥션 풀 이하, 요청률은 DartClient 토큰 버킷이 제한)
 
-OUT_COLUMNS = [
-    "rcp_no", "corp_code", "event_date", "event_type", "sub_type",
-    "amount", "counterparty", "summary",
-    "report_nm", "rcept_dt"
-]
+# 출력 스키마 고정(pandas object 컬럼 추론 없이 dtype 확정)
+SCHEMA = pa.schema([
+    ("rcp_no", pa.string()),
+    ("corp_code", pa.string()),
+    ("event_date", pa.date32()),    # 접수일 기준 이벤트일(하류에서 문자열 파싱 없이 날짜로 사용)
+    ("event_type", pa.string()),
+    ("sub_type", pa.string()),
+    ("amount", pa.string()),        # 2.5단계 문서 파싱 원문(예: "1,234")
+    ("counterparty", pa.string()),
+    ("summary", pa.string()),
+    ("report_nm", pa.string()),
+    ("rcept_dt", pa.string()),
+])
+OUT_COLUMNS = SCHEMA.names
+
+# (year, event_type) hive 파티션(out_path/year=YYYY/event_type=XXX/part-*.parquet)으로 저장.
+# 하류에서 filters=[("year",">=",2024),("event_type","in",[...])]로 필요한 파일만 읽음.
+# year는 event_date에서 파생(파일 본문에는 없고 경로로만 존재), event_date가 없으면 기본(null) 파티션
+PARTITION_SCHEMA = pa.schema([("year", pa.int16()), ("event_type", pa.string())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+# 저장 옵션: zstd + 반복이 많은 문자열만 사전 인코딩(event_type은 경로로만 존재)
+WRITE_OPTIONS = ds.ParquetFileFormat().make_write_options(
+    compression="zstd", compression_level=3,
+    use_dictionary=["corp_code", "sub_type", "report_nm", "rcept_dt"],
+)
 
 # ---------------------------------------
 # 이벤트 규칙(Report Name 기반 매핑)
@@ -54,29 +92,53 @@ EVENT_RULES: List[Tuple[str, str, Optional[str]]] = [
     ("타법인 주식 및 출자증권 양도", "EQUITY_DISP", "DISP"),
 ]
 
+MAJOR_REPORT_KW = "주요사항보고서"
+
+# 모든 키워드를 하나로 묶은 사전 컴파일 패턴: 대부분의 공시(정기보고서 등)는 어떤 키워드에도 걸리지 않으므로
+# 한 번의 C 레벨 스캔으로 걸러내고, 걸린 경우에만 규칙 순서대로 확인(규칙 우선순위 유지)
+_EVENT_KW_RE = re.compile("|".join(re.escape(kw) for kw, _, _ in EVENT_RULES)
+                          + "|" + re.escape(MAJOR_REPORT_KW))
+
+# 첫 글자 → (규칙 순번, 키워드, event_type, sub_type): 보고서명에 등장하는 글자의 버킷만 확인
+_RULES_BY_FIRST: Dict[str, List[Tuple[int, str, str, Optional[str]]]] = defaultdict(list)
+for _i, (_kw, _etype, _sub) in enumerate(EVENT_RULES):
+    _RULES_BY_FIRST[_kw[0]].append((_i, _kw, _etype, _sub))
+_RULE_FIRST_CHARS = frozenset(_RULES_BY_FIRST)
+
+
+@lru_cache(maxsize=4096)
 def _classify_event(report_nm: str) -> Tuple[Optional[str], Optional[str]]:
-    """보고서명(report_nm)에서 event_type/sub_type 분류."""
+    """보고서명(report_nm)에서 event_type/sub_type 분류. 보고서명은 반복이 많아 결과를 메모이즈."""
     if not isinstance(report_nm, str):
         return (None, None)
     name = report_nm.strip()
-    for kw, etype, sub in EVENT_RULES:
-        if kw in name:
-            return (etype, sub)
+    if _EVENT_KW_RE.search(name) is None:
+        return (None, None)
+    # 여러 키워드가 걸리면 EVENT_RULES 앞쪽 규칙 우선(예: "분할합병"은 "합병" 규칙)
+    best = None
+    for ch in _RULE_FIRST_CHARS.intersection(name):
+        for i, kw, etype, sub in _RULES_BY_FIRST[ch]:
+            if (best is None or i < best[0]) and kw in name:
+                best = (i, etype, sub)
+    if best is not None:
+        return best[1:]
     # 대체: '주요사항보고서' 등 포괄 명칭만 있는 경우
-    if "주요사항보고서" in name:
+    if MAJOR_REPORT_KW in name:
         return ("MAJOR", None)
     return (None, None)
 
 
-def _load_corp_master(path: str) -> pd.DataFrame:
+def _load_corp_master(path: str, columns: Sequence[str] = ("corp_code",)) -> pd.DataFrame:
     if not os.path.exists(path):
         raise FileNotFoundError(
             f"corp_master not found: {path}. 먼저 `python run_pipeline.py bootstrap` 실행하세요."
         )
-    df = pd.read_parquet(path)
-    need = {"corp_code","corp_name","stock_code","is_listed"}
-    for m in need.difference(df.columns):
-        df[m] = None
+    # 필요한 컬럼만 읽음(파케이 컬럼 프로젝션). 파일에 없는 컬럼은 None으로 채움
+    have = set(pq.read_schema(path).names)
+    df = pd.read_parquet(path, columns=[c for c in columns if c in have])
+    for m in columns:
+        if m not in df.columns:
+            df[m] = None
     return df
 
 
@@ -89,129 +151,281 @@ def _daterange_chunks(bgn: dt.date, end: dt.date, step_days: int):
         cur = nxt + dt.timedelta(days=1)
 
 
-def _fetch_list_for_company(client: DartClient, corp_code: str,
-                            bgn_de: str, end_de: str) -> List[Dict]:
-    """DART list API 한 회사에 대해 기간 내 페이지네이션 수집."""
-    rows = []
+def _list_params(corp_code: Optional[str], bgn_de: str, end_de: str, page_no: int = 1,
+                 pblntf_ty: Optional[str] = None) -> Dict:
+    p = {
+        "bgn_de": bgn_de,   # YYYYMMDD
+        "end_de": end_de,   # YYYYMMDD
+        "page_no": page_no,
+        "page_count": PAGE_COUNT
+    }
+    if corp_code is not None:
+        p["corp_code"] = corp_code
+    if pblntf_ty is not None:
+        p["pblntf_ty"] = pblntf_ty
+    return p
+
+
+def _page_rows(j: Dict) -> Tuple[List[Dict], int]:
+    """list 응답 한 페이지 → (행 목록, 전체 페이지 수). 예외 상태/빈 목록은 ([], 0)."""
+    status = str(j.get("status", ""))
+    if status not in {"000", "013"}:
+        # 예외 상태는 빈 결과 처리
+        return [], 0
+    lst = j.get("list", [])
+    if not lst:
+        return [], 0
+    rows = [{
+        "rcept_no": it.get("rcept_no", ""),      # 접수번호
+        "corp_code": it.get("corp_code", ""),
+        "corp_name": it.get("corp_name", ""),
+        "rcept_dt": it.get("rcept_dt", ""),      # YYYYMMDD
+        "report_nm": it.get("report_nm", ""),
+    } for it in lst]
+    total_count = int(j.get("total_count", len(lst)))
+    return rows, math.ceil(total_count / PAGE_COUNT) if total_count else 1
+
+
+def _page_failed(j: Dict) -> bool:
+    # get_many 실패(빈 dict)나 오류 상태(요청 제한 등) — 013(데이터 없음)은 정상 빈 결과
+    return str(j.get("status", "")) not in {"000", "013"}
+
+
+def _collect_list_pages(client: DartClient, first: Dict, corp_code: str,
+                        bgn_de: str, end_de: str, pblntf_ty: Optional[str] = None) -> List[Dict]:
+    """DART list API 첫 페이지 응답(first)부터 남은 페이지를 순회 수집(회사 단위 조회: 페이지 수가 적음)."""
+    rows, max_page = _page_rows(first)
     page_no = 1
-    while True:
-        j = client.get("list", {
-            "corp_code": corp_code,
-            "bgn_de": bgn_de,   # YYYYMMDD
-            "end_de": end_de,   # YYYYMMDD
-            "page_no": page_no,
-            "page_count": PAGE_COUNT
-        })
-        status = str(j.get("status", ""))
-        if status not in {"000", "013"}:
-            # 예외 상태는 빈 결과 처리
-            break
-        lst = j.get("list", [])
-        if not lst:
+    while page_no < max_page:
+        page_no += 1
+        more, _ = _page_rows(client.get("list", _list_params(corp_code, bgn_de, end_de, page_no, pblntf_ty)))
+        if not more:
             break
+        rows.extend(more)
+    return rows
+
+
+def _fetch_list_for_window(client: DartClient, bgn_de: str, end_de: str, pblntf_ty: str) -> Tuple[List[Dict], int]:
+    """
+    회사 지정 없이 윈도우 내 pblntf_ty 유형 공시 전체를 수집.
+    첫 페이지로 전체 페이지 수를 확인한 뒤 나머지 페이지는 TASK_BATCH개씩 동시 요청.
+    실패한 페이지(한 페이지 = 전 회사 공시 최대 PAGE_COUNT건)는 한 번 더 순차 재시도.
+    반환: (공시 목록, 재시도 후에도 실패한 페이지 수)
+    """
+    first = client.get("list", _list_params(None, bgn_de, end_de, 1, pblntf_ty))
+    if _page_failed(first):
+        first = client.get("list", _list_params(None, bgn_de, end_de, 1, pblntf_ty))
+        if _page_failed(first):
+            # 전체 페이지 수를 모름 → 윈도우·유형 전체가 누락(1페이지로 집계)
+            print(f"[WARN] list page fail window={bgn_de}~{end_de} type={pblntf_ty} page=1")
+            return [], 1
+    rows, max_page = _page_rows(first)
+    failed = []
+    for start in range(2, max_page + 1, TASK_BATCH):
+        pages = range(start, min(start + TASK_BATCH, max_page + 1))
+        resps = client.get_many([("list", _list_params(None, bgn_de, end_de, p, pblntf_ty)) for p in pages],
+                                max_workers=MAX_WORKERS)
+        for p, j in zip(pages, resps):
+            if _page_failed(j):
+                failed.append(p)
+            else:
+                rows.extend(_page_rows(j)[0])
+    n_failed = 0
+    for p in failed:
+        try:
+            j = client.get("list", _list_params(None, bgn_de, end_de, p, pblntf_ty))
+        except Exception:
+            j = {}
+        if _page_failed(j):
+            n_failed += 1
+            print(f"[WARN] list page fail window={bgn_de}~{end_de} type={pblntf_ty} page={p}")
+        else:
+            rows.extend(_page_rows(j)[0])
+    return rows, n_failed
 
-        for it in lst:
-            rows.append({
-                "rcept_no": it.get("rcept_no", ""),      # 접수번호
-                "corp_code": it.get("corp_code", ""),
-                "corp_name": it.get("corp_name", ""),
-                "rcept_dt": it.get("rcept_dt", ""),      # YYYYMMDD
-                "report_nm": it.get("report_nm", ""),
-            })
-
-        total_count = int(j.get("total_count", len(lst)))
-        max_page = math.ceil(total_count / PAGE_COUNT) if total_count else page_no
-        if page_no >= max_page:
+
+def _iter_by_company(client: DartClient, corp_codes: List[str],
+                     windows: List[Tuple[str, str]]) -> Iterator[Tuple[List[Dict], str]]:
+    """(회사, 윈도우) 작업을 TASK_BATCH개씩 첫 페이지 동시 요청(공시유형 무관) → (공시 목록, 진행 문자열)."""
+    done = 0
+    total_tasks = len(corp_codes) * len(windows)
+    task_iter = _iter_tasks(corp_codes, windows)
+    while True:
+        tasks = list(islice(task_iter, TASK_BATCH))
+        if not tasks:
             break
-        page_no += 1
-        time.sleep(SLEEP_SEC)
-    return rows
+        firsts = client.get_many([("list", _list_params(*t)) for t in tasks], max_workers=MAX_WORKERS)
+        rows = []
+        for (corp_code, bgn_de, end_de), first in zip(tasks, firsts):
+            try:
+                rows.extend(_collect_list_pages(client, first, corp_code, bgn_de, end_de))
+            except Exception as e:
+                print(f"[WARN] list fail corp={corp_code} {bgn_de}~{end_de}: {e}")
+        done += len(tasks)
+        yield rows, f"{done}/{total_tasks} ({done/total_tasks:.1%})"
+
+
+def _iter_by_window(client: DartClient, windows: List[Tuple[str, str]]) -> Iterator[Tuple[List[Dict], str]]:
+    """윈도우 × 공시유형 단위 전체 스캔 → (공시 목록, 진행 문자열). 끝나면 누락 페이지 수를 보고."""
+    n_failed = 0
+    for k, (bgn_de, end_de) in enumerate(windows, 1):
+        rows = []
+        for ty in PBLNTF_TYPES:
+            try:
+                got, bad = _fetch_list_for_window(client, bgn_de, end_de, ty)
+                rows.extend(got)
+                n_failed += bad
+            except Exception as e:
+                print(f"[WARN] list fail window={bgn_de}~{end_de} type={ty}: {e}")
+        yield rows, f"window {k}/{len(windows)} ({k/len(windows):.1%})"
+    if n_failed:
+        print(f"[WARN] window scan: {n_failed} list pages failed after retry "
+              f"(up to {n_failed * PAGE_COUNT} filings missing)")
+
+
+# 목록 단계에서 채우는 컬럼(나머지 amount/counterparty/summary는 2.5단계 보강 전까지 전부 null)
+# event_date는 flush 시 rcept_dt에서 벡터 파싱(행마다 strptime 하지 않음)
+LIST_COLUMNS = ["rcp_no", "corp_code", "event_type", "sub_type", "report_nm", "rcept_dt"]
+
+
+def _new_event_cols() -> Dict[str, List]:
+    return {c: [] for c in LIST_COLUMNS}
+
+
+def _append_event_rows(cols: Dict[str, List], lst: List[Dict], seen: set,
+                       corp_filter: Optional[set] = None):
+    """
+    list 결과 중 이벤트 후보만 필터(키워드 매칭)하여 컬럼별 리스트(cols)에 바로 누적(행 dict 생성 없음).
+    공시 대부분은 이벤트가 아니므로 청크 단위 DataFrame에서 고유 보고서명만 분류한 뒤
+    마스크로 한 번에 걸러내고, 남은 소수 행만 Python으로 누적.
+    seen: 이미 누적한 (rcp_no, corp_code) 집합 — 윈도우 스캔 중 신규 공시로 페이지가 밀려
+    같은 공시가 두 번 오는 경우를 해시 조회로 바로 제외(파일 단위 drop_duplicates 불필요).
+    corp_filter가 주어지면 해당 회사 공시만 남김(윈도우 스캔용).
+    """
+    if not lst:
+        return
+    ldf = pd.DataFrame.from_records(lst, columns=["rcept_no", "corp_code", "rcept_dt", "report_nm"])
+    names = ldf["report_nm"].fillna("")
+    codes, uniq = pd.factorize(names)
+    res = [_classify_event(nm) for nm in uniq]
+    etypes = np.array([r[0] for r in res], dtype=object)[codes]
+    subs = np.array([r[1] for r in res], dtype=object)[codes]
+    keep = pd.notna(etypes)
+    if corp_filter is not None:
+        keep &= ldf["corp_code"].isin(corp_filter).to_numpy()
+    if not keep.any():
+        return  # 관심 없는 일반 공시만 있는 청크
+
+    idx = np.flatnonzero(keep)
+    for rcp, corp, rdt, nm, etype, sub in zip(ldf["rcept_no"].to_numpy()[idx], ldf["corp_code"].to_numpy()[idx],
+                                              ldf["rcept_dt"].to_numpy()[idx], names.to_numpy()[idx],
+                                              etypes[idx], subs[idx]):
+        k = (rcp, corp)
+        if k in seen:
+            continue
+        seen.add(k)
+        cols["rcp_no"].append(rcp)
+        cols["corp_code"].append(corp)
+        cols["event_type"].append(etype)
+        cols["sub_type"].append(sub)
+        cols["report_nm"].append(nm)
+        cols["rcept_dt"].append(rdt)
 
 
 def backfill_events(env: dict, years: int, out_path: str):
     """
     최근 N년 동안의 'list' 공시를 전사 스캔하여 이벤트 후보를 정규화.
     - report_nm을 기반으로 표준 event_type/sub_type 태깅
+    - 회사가 많으면(WINDOW_SCAN_MIN_CORPS 이상) 90일 윈도우별 전체 공시(PBLNTF_TYPES)를 받아 회사 집합으로 필터
+    - 적으면 (회사 × 90일 윈도우) 작업을 TASK_BATCH개씩 첫 페이지 동시 요청(공시유형 제한 없음)
+    - 요청률은 DartClient 토큰 버킷이 제한
     - 금액/상대방/요약은 후속(2.5단계)에서 상세 파싱으로 보강 예정
     """
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    client = DartClient(env["DART_API_KEY"], sleep_sec=SLEEP_SEC)
+    # 이전 출력(단일 파일 또는 파티션 디렉터리)은 전체 재수집이므로 지우고 시작
+    if os.path.isfile(out_path):
+        os.remove(out_path)
+    elif os.path.isdir(out_path):
+        shutil.rmtree(out_path)
+    os.makedirs(out_path, exist_ok=True)
 
     # 기간 계산
     end_date = dt.date.today()
     start_date = end_date - dt.timedelta(days=365*years)
+    # 기간을 90일 윈도우로 쪼개어 조회
+    windows = [(b.strftime("%Y%m%d"), e.strftime("%Y%m%d"))
+               for b, e in _daterange_chunks(start_date, end_date, WINDOW_DAYS)]
 
     # 회사 마스터
     dim = _load_corp_master("data/corp_master.parquet")
+    corp_codes = dim["corp_code"].astype(str).tolist()
 
-    all_rows = []
-    total_tasks = len(dim)
-    for idx, r in dim.reset_index(drop=True).iterrows():
-        corp_code = str(r["corp_code"])
-        # 기간을 90일 윈도우로 쪼개어 조회
-        for bgn, ed in _daterange_chunks(start_date, end_date, WINDOW_DAYS):
-            bgn_de = bgn.strftime("%Y%m%d")
-            end_de = ed.strftime("%Y%m%d")
-            try:
-                lst = _fetch_list_for_company(client, corp_code, bgn_de, end_de)
-            except Exception as e:
-                print(f"[WARN] list fail corp={corp_code} {bgn_de}~{end_de}: {e}")
-                continue
-
-            # 이벤트 후보만 필터(키워드 매칭)
-            for it in lst:
-                report_nm = it["report_nm"] or ""
-                etype, sub = _classify_event(report_nm)
-                if etype is None:
-                    continue  # 관심 없는 일반 공시는 스킵
-
-                rcept_dt = it.get("rcept_dt", "")
-                # 날짜 정규화
-                try:
-                    event_date = dt.datetime.strptime(rcept_dt, "%Y%m%d").date().isoformat()
-                except Exception:
-                    event_date = None
-
-                all_rows.append({
-                    "rcp_no": it["rcept_no"],
-                    "corp_code": it["corp_code"],
-                    "event_date": event_date,
-                    "event_type": etype,
-                    "sub_type": sub,
-                    "amount": None,         # 2.5단계에서 상세 파싱으로 보강
-                    "counterparty": None,   # 2.5단계에서 상세 파싱으로 보강
-                    "summary": None,        # 2.5단계에서 상세 파싱 또는 NLP로 보강
-                    "report_nm": report_nm,
-                    "rcept_dt": rcept_dt,
-                })
+    pending = _new_event_cols()
+    seen = set()
+    written = 0
+    n_ckpt = 0
+    corp_filter = None
+    # 체크포인트마다 완결된 파티션 파일을 쓰므로 예외로 중단돼도 그때까지의 결과는 읽을 수 있음
+    with DartClient(env["DART_API_KEY"], sleep_sec=SLEEP_SEC) as client:
+        if len(corp_codes) >= WINDOW_SCAN_MIN_CORPS:
+            print(f"[INFO] window scan: {len(windows)} windows x types={PBLNTF_TYPES}")
+            corp_filter = set(corp_codes)
+            batches = _iter_by_window(client, windows)
+        else:
+            batches = _iter_by_company(client, corp_codes, windows)
+
+        for lst, progress in batches:
+            _append_event_rows(pending, lst, seen, corp_filter)
 
             # 체크포인트 저장
-            if len(all_rows) and len(all_rows) % CHECKPOINT_EVERY == 0:
-                _write_checkpoint(all_rows, out_path, mode="ab")
+            if len(pending["rcp_no"]) >= ROW_GROUP_SIZE:
+                written += _write_checkpoint(out_path, n_ckpt, pending)
+                n_ckpt += 1
+                pending = _new_event_cols()
 
-        if (idx + 1) % 100 == 0:
-            print(f"[INFO] company progress {idx+1}/{total_tasks} ({(idx+1)/total_tasks:.1%})")
+            print(f"[INFO] list progress {progress}")
 
-    # 최종 저장
-    _write_checkpoint(all_rows, out_path, mode="wb")
-    print(f"[OK] events saved: {out_path}, rows={len(all_rows)}")
+        # 최종 저장
+        written += _write_checkpoint(out_path, n_ckpt, pending)
+    print(f"[OK] events saved: {out_path}, rows={written}")
 
 
-def _write_checkpoint(rows: List[Dict], out_path: str, mode: str = "wb"):
-    """rows를 파케이로 저장(헤더 스키마를 OUT_COLUMNS로 정렬)."""
-    if not rows:
-        if not os.path.exists(out_path):
-            pd.DataFrame(columns=OUT_COLUMNS).to_parquet(out_path, index=False)
-        return
-    df = pd.DataFrame(rows)
-    for c in OUT_COLUMNS:
-        if c not in df.columns:
-            df[c] = None
-    df = df[OUT_COLUMNS]
-    if mode == "wb" or not os.path.exists(out_path):
-        df.to_parquet(out_path, index=False)
-    else:
-        old = pd.read_parquet(out_path) if os.path.exists(out_path) else pd.DataFrame(columns=OUT_COLUMNS)
-        merged = pd.concat([old, df], ignore_index=True)
-        merged.drop_duplicates(subset=["rcp_no","corp_code"], keep="last", inplace=True)
-        merged.to_parquet(out_path, index=False)
+def _iter_tasks(corp_codes: List[str], windows: List[Tuple[str, str]]) -> Iterator[Tuple[str, str, str]]:
+    """(corp_code, bgn_de, end_de) 작업을 회사 순서대로 지연 생성."""
+    for c in corp_codes:
+        for bgn_de, end_de in windows:
+            yield (c, bgn_de, end_de)
+
+
+def write_events_dataset(table: pa.Table, out_path: str, basename_template: str = "part-{i}.parquet",
+                         existing_data_behavior: str = "overwrite_or_ignore"):
+    """SCHEMA 테이블에 year(event_date 연도)를 붙여 (year, event_type) 파티션으로 기록."""
+    table = table.append_column("year", pc.year(table["event_date"]).cast(pa.int16()))
+    ds.write_dataset(table, out_path, format="parquet", partitioning=PARTITIONING,
+                     basename_template=basename_template, existing_data_behavior=existing_data_behavior,
+                     file_options=WRITE_OPTIONS, max_rows_per_group=ROW_GROUP_SIZE)
+
+
+def read_events_table(path: str) -> pa.Table:
+    """파티션 디렉터리(또는 예전 단일 파일)를 SCHEMA 컬럼 순서의 Arrow 테이블로 읽음."""
+    if os.path.isdir(path):
+        return ds.dataset(path, format="parquet", partitioning=PARTITIONING).to_table(columns=OUT_COLUMNS)
+    return pq.read_table(path, columns=OUT_COLUMNS)
+
+
+def _write_checkpoint(out_path: str, n_ckpt: int, cols: Dict[str, List]) -> int:
+    """
+    컬럼별 리스트(cols)를 SCHEMA 타입의 테이블로 변환해 파티션별 파일(part-{n_ckpt}-*)로 추가 기록.
+    event_date는 rcept_dt(YYYYMMDD)를 배치 단위로 파싱(형식 오류는 null), 비어 있는 보강 컬럼은 null 배열로 채움.
+    (rcp_no, corp_code) 중복은 누적 시점(_append_event_rows의 seen)에서 제외되므로 재병합하지 않음.
+    반환: 기록한 행 수
+    """
+    n = len(cols["rcp_no"])
+    if n == 0:
+        return 0
+    arrays = {c: pa.array(v, SCHEMA.field(c).type) for c, v in cols.items()}
+    arrays["event_date"] = pc.strptime(arrays["rcept_dt"], format="%Y%m%d", unit="s",
+                                       error_is_null=True).cast(pa.date32())
+    batch = [arrays[f.name] if f.name in arrays else pa.nulls(n, f.type) for f in SCHEMA]
+    write_events_dataset(pa.Table.from_arrays(batch, schema=SCHEMA), out_path,
+                         basename_template=f"part-{n_ckpt:05d}-{{i}}.parquet")
+    return n
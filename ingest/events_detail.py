@@ -1,14 +1,19 @@
 import os
 import io
 import re
+import shutil
 import zipfile
 import datetime as dt
-from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Pattern, Tuple
 
 import pandas as pd
-from bs4 import BeautifulSoup
+import pyarrow as pa
+from lxml import etree
+import lxml.html
 
 from common.dart_client import DartClient
+from ingest.events import SCHEMA as EVENTS_SCHEMA, read_events_table, write_events_dataset
 
 # --------------------------
 # 설정값
@@ -16,6 +21,8 @@ from common.dart_client import DartClient
 MAX_DOCS_PER_EVENT = 6      # rcp_no 당 확인할 첨부/본문 최대 개수
 TEXT_BYTES_LIMIT    = 2_000_000  # 너무 큰 파일은 스킵(2MB)
 SUMMARY_LEN         = 160    # 요약 최대 길이(문장 자르기)
+MAX_WORKERS         = 8      # rcp_no 동시 처리 스레드 수(DartClient 커넥션 풀 이하)
+PROGRESS_EVERY      = 200
 AMOUNT_KEYS = [
     r"취득금액", r"양수도[ ]?금액", r"거래[ ]?금액", r"총[ ]?투자[ ]?금액",
     r"자산[ ]?양수[ ]?금액", r"영업[ ]?양수[ ]?대가", r"주식[ ]?취득[ ]?대금",
@@ -25,19 +32,45 @@ COUNTERPARTY_KEYS = [
     r"거래상대방", r"상대[ ]?회사", r"상대[ ]?법인", r"양수인", r"양도인", r"피인수[ ]?회사",
     r"채권은행", r"법원", r"소송[ ]?상대방", r"관리[ ]?주체"
 ]
-# 숫자 패턴 (1,234,567 또는 123억 4,567만원 등)
-NUM_PAT = re.compile(r"[-]?\(?\d{1,3}(?:,\d{3})*(?:\.\d+)?\)?|(\d+)\s*억|\d+\s*원")
+# 키워드 목록을 하나의 패턴으로 묶어 import 시 한 번만 컴파일(문서마다 키워드 수만큼 재스캔하지 않음)
+AMOUNT_RE = re.compile("|".join(f"(?:{kr})" for kr in AMOUNT_KEYS))
+COUNTERPARTY_RE = re.compile("|".join(f"(?:{kr})" for kr in COUNTERPARTY_KEYS))
+# 숫자 패턴 (1,234,567 또는 123억 4,567만원 등). 캡처 그룹 없이 반복 횟수를 제한해
+# 긴 숫자열에서도 백트래킹이 커지지 않도록 함(천 단위 구분 최대 5회 = 조 단위, 소수 4자리)
+NUM_PAT = re.compile(r"-?\(?\d{1,3}(?:,\d{3}){0,5}(?:\.\d{1,4})?\)?|\d{1,10}\s*[억원만]")
+NUM_WINDOW = 80  # 키워드 뒤로 숫자를 찾을 최대 글자 수
+# 상대방 후보: "거래상대방: ㈜OOO" / "상대회사 ㈜OOO" / "(주)OOO"
+_CP_COLON_RE = re.compile(r"[:：]\s*([^\n]+)")
+_CP_BRACKET_RE = re.compile(r"[『「(]\s*([^)\n]{2,40})")
+_CP_SPLIT_RE = re.compile(r"[，,;/\n]")
+# 텍스트 공백 정리
+_WS_RE = re.compile(r"[ \t]+")
+_NL_RE = re.compile(r"\n{2,}")
+
+# lxml 파서는 재사용(BeautifulSoup 트리 없이 C 레벨 트리만 만듦). recover: 깨진 공시 HTML도 최대한 파싱
+_HTML_PARSER = lxml.html.HTMLParser(remove_comments=True, remove_pis=True)
+# 가장 일반적인 구조: <list> 요소들(네임스페이스가 붙어도 매칭되도록 {*} 와일드카드)
+DOC_ITEM_TAGS = ("{*}list", "{*}item", "{*}attached")
+DOC_NAME_TAGS = ("fileName", "filename", "title", "name")
+DOC_URL_TAGS = ("url", "fileUrl", "downloadUrl")
+ENRICH_COLUMNS = ["amount", "counterparty", "summary"]
 
 def _clean_text(html_or_xml_bytes: bytes) -> str:
     if not html_or_xml_bytes:
         return ""
-    # HTML/XML을 soup로 파싱 후 텍스트 추출
-    soup = BeautifulSoup(html_or_xml_bytes, "lxml")
-    # 테이블 텍스트도 포함해서 추출
-    text = soup.get_text("\n", strip=True)
+    # HTML/XML을 lxml로 바로 파싱 후 텍스트 추출(script/style 본문은 제외)
+    try:
+        root = etree.fromstring(html_or_xml_bytes, _HTML_PARSER)
+    except (etree.LxmlError, ValueError):
+        return ""
+    if root is None:
+        return ""
+    etree.strip_elements(root, "script", "style", with_tail=False)
+    # 테이블 텍스트도 포함해서 추출(노드별 텍스트를 strip 후 줄바꿈으로 결합)
+    text = "\n".join(t for t in (s.strip() for s in root.itertext()) if t)
     # 공백 정리
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\n{2,}", "\n", text)
+    text = _WS_RE.sub(" ", text)
+    text = _NL_RE.sub("\n", text)
     return text
 
 def _take_summary(text: str, max_len: int = SUMMARY_LEN) -> str:
@@ -49,76 +82,67 @@ def _take_summary(text: str, max_len: int = SUMMARY_LEN) -> str:
         para = para[:max_len].rstrip() + "…"
     return para
 
-def _find_first_number_near(text: str, key_regexes: List[str]) -> Optional[str]:
-    # 키워드 근처(+/- 80자)에서 숫자 후보 추출
-    for kr in key_regexes:
-        for m in re.finditer(kr, text):
-            s_idx = max(0, m.start() - 80)
-            e_idx = min(len(text), m.end() + 80)
-            window = text[s_idx:e_idx]
-            nm = re.search(NUM_PAT, window)
-            if nm:
-                return nm.group(0)
+def _find_first_number_near(text: str, key_re: Pattern) -> Optional[str]:
+    # 키워드 뒤 NUM_WINDOW자 이내에서 숫자 후보 추출(키워드 전체를 한 번의 스캔으로, 등장 순서대로)
+    # 공시 표는 "취득금액 | 1,234" 처럼 값이 키워드 뒤에 오므로 앞쪽은 보지 않음(앞 항목의 숫자 오검출 방지)
+    for m in key_re.finditer(text):
+        nm = NUM_PAT.search(text, m.end(), m.end() + NUM_WINDOW)
+        if nm:
+            return nm.group(0)
     return None
 
-def _find_counterparty(text: str, key_regexes: List[str]) -> Optional[str]:
-    for kr in key_regexes:
-        for m in re.finditer(kr, text):
-            s_idx = m.end()
-            # 키워드 다음 40자 이내에서 괄호/따옴표/콜론 뒤 텍스트를 상대방으로 추정
-            window = text[s_idx:s_idx+80]
-            # 예: "거래상대방: ㈜OOO" / "상대회사 ㈜OOO" / "(주)OOO"
-            m2 = re.search(r"[:：]\s*([^\n]+)", window) or re.search(r"[『「(]\s*([^)\n]{2,40})", window)
-            if m2:
-                cand = m2.group(1).strip()
-                # 너무 긴 건 자름
-                cand = re.split(r"[，,;/\n]", cand)[0].strip()
-                return cand
+def _find_counterparty(text: str, key_re: Pattern) -> Optional[str]:
+    for m in key_re.finditer(text):
+        s_idx = m.end()
+        # 키워드 다음 80자 이내에서 괄호/따옴표/콜론 뒤 텍스트를 상대방으로 추정
+        window = text[s_idx:s_idx+80]
+        m2 = _CP_COLON_RE.search(window) or _CP_BRACKET_RE.search(window)
+        if m2:
+            cand = m2.group(1).strip()
+            # 너무 긴 건 자름
+            cand = _CP_SPLIT_RE.split(cand, 1)[0].strip()
+            return cand
     return None
 
 def _extract_from_text(text: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
     if not text:
         return (None, None, None)
-    amount = _find_first_number_near(text, AMOUNT_KEYS)
-    counter = _find_counterparty(text, COUNTERPARTY_KEYS)
+    amount = _find_first_number_near(text, AMOUNT_RE)
+    counter = _find_counterparty(text, COUNTERPARTY_RE)
     summary = _take_summary(text, SUMMARY_LEN)
     return (amount, counter, summary)
 
 # --------------------------
 # document.xml 파서
 # --------------------------
+def _first_child_text(node, tags: Tuple[str, ...]) -> Optional[str]:
+    """tags 우선순위대로 하위 요소(네임스페이스 무시)에서 첫 비어있지 않은 텍스트."""
+    for tag in tags:
+        for el in node.iterdescendants("{*}" + tag):
+            txt = "".join(el.itertext()).strip()
+            if txt:
+                return txt
+    return None
+
 def _parse_document_xml(xml_bytes: bytes) -> List[Dict]:
     """
     document.xml의 첨부/본문 목록을 파싱하여 다운로드 가능한 URL 후보 리스트를 반환.
     케이스별로 XML 구조가 상이할 수 있어, <fileName>/<url> 등 일반적인 필드를 폭넓게 탐색.
+    iterparse로 항목 단위 스트리밍(처리한 항목은 clear → 전체 DOM을 유지하지 않음).
     """
-    soup = BeautifulSoup(xml_bytes, "xml")
-    items = []
-    # 가장 일반적인 구조: <list> 요소들
-    for node in soup.find_all(["list", "item", "attached"]):
-        name = None
-        url  = None
-        for tag in ["fileName", "filename", "title", "name"]:
-            el = node.find(tag)
-            if el and el.text:
-                name = el.text.strip()
-                break
-        for tag in ["url", "fileUrl", "downloadUrl"]:
-            el = node.find(tag)
-            if el and el.text:
-                url = el.text.strip()
-                break
-        if name or url:
-            items.append({"name": name, "url": url})
-    # 중복 제거
-    uniq = []
-    seen = set()
-    for it in items:
-        k = (it.get("name"), it.get("url"))
-        if k not in seen:
-            uniq.append(it)
-            seen.add(k)
-    return uniq
+    # (name, url) → 항목: dict 삽입 순서로 첫 등장 순서를 유지하며 중복 제거
+    uniq: Dict[Tuple[Optional[str], Optional[str]], Dict] = {}
+    try:
+        for _, node in etree.iterparse(io.BytesIO(xml_bytes), events=("end",), tag=DOC_ITEM_TAGS,
+                                       recover=True, remove_comments=True, resolve_entities=False):
+            name = _first_child_text(node, DOC_NAME_TAGS)
+            url = _first_child_text(node, DOC_URL_TAGS)
+            if name or url:
+                uniq.setdefault((name, url), {"name": name, "url": url})
+            node.clear(keep_tail=True)
+    except (etree.LxmlError, ValueError):
+        pass  # 깨진 문서는 그때까지 읽은 항목만 사용
+    return list(uniq.values())
 
 def _viewer_urls(rcept_no: str) -> List[str]:
     """
@@ -130,6 +154,16 @@ def _viewer_urls(rcept_no: str) -> List[str]:
         f"https://dart.fss.or.kr/dsaf001/main.do?rcpNo={rcept_no}",
     ]
 
+def _save_events(df: pd.DataFrame, events_in: str, events_out: str):
+    """events와 같은 (year, event_type) 파티션 구조로 저장. 같은 경로면 기록하는 파티션만 교체."""
+    if os.path.isfile(events_out):
+        os.remove(events_out)
+    elif os.path.isdir(events_out) and os.path.realpath(events_out) != os.path.realpath(events_in):
+        shutil.rmtree(events_out)
+    os.makedirs(events_out, exist_ok=True)
+    table = pa.Table.from_pandas(df[EVENTS_SCHEMA.names], schema=EVENTS_SCHEMA, preserve_index=False)
+    write_events_dataset(table, events_out, existing_data_behavior="delete_matching")
+
 # --------------------------
 # 메인: events 상세 보강
 # --------------------------
@@ -139,22 +173,19 @@ def enrich_events_detail(env: dict, events_in: str, events_out: str):
     금액/상대방/요약을 베스트에포트로 채워서 events_out에 저장.
     기존 amount/counterparty/summary 값이 이미 있으면 덮어쓰지 않음(보수적).
     """
-    os.makedirs(os.path.dirname(events_out), exist_ok=True)
     if not os.path.exists(events_in):
         raise FileNotFoundError(f"events parquet not found: {events_in}")
 
-    df = pd.read_parquet(events_in)
+    # 입력을 전부 메모리로 읽은 뒤 기록하므로 events_in == events_out(기본값)이어도 안전
+    df = read_events_table(events_in).to_pandas()
     if df.empty:
-        df.to_parquet(events_out, index=False)
+        _save_events(df, events_in, events_out)
         print(f"[OK] events(empty) saved: {events_out}")
         return
 
     client = DartClient(env["DART_API_KEY"])
 
     # rcp_no 유니크
-    df["_amount"] = df.get("amount")
-    df["_counter"] = df.get("counterparty")
-    df["_summary"] = df.get("summary")
     keys = df["rcp_no"].dropna().astype(str).unique().tolist()
 
     def try_enrich_one(rcp_no: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
@@ -206,27 +237,28 @@ def enrich_events_detail(env: dict, events_in: str, events_out: str):
                 break
         return (best_amount, best_counter, best_summary)
 
-    # 실제 보강
+    # 실제 보강: rcp_no 단위로 스레드 풀에서 동시 처리(네트워크 대기가 대부분이라 GIL 영향 적음)
+    # 요청률은 DartClient 토큰 버킷이 전역으로 제한하므로 워커 수와 무관하게 안전
     enriched = {}
-    for rcp in keys:
-        a, c, s = try_enrich_one(rcp)
-        enriched[rcp] = {"amount": a, "counterparty": c, "summary": s}
-
-    # 병합(기존 값이 있으면 유지)
-    out_rows = []
-    for i, r in df.iterrows():
-        rcp = str(r["rcp_no"])
-        a0 = r.get("amount")
-        c0 = r.get("counterparty")
-        s0 = r.get("summary")
-        add = enriched.get(rcp, {})
-        row = dict(r)
-        row["amount"] = a0 if pd.notna(a0) and a0 not in ("", None) else add.get("amount")
-        row["counterparty"] = c0 if pd.notna(c0) and c0 not in ("", None) else add.get("counterparty")
-        row["summary"] = s0 if pd.notna(s0) and s0 not in ("", None) else add.get("summary")
-        out_rows.append(row)
-
-    out = pd.DataFrame(out_rows)
-    out.drop(columns=[c for c in ["_amount","_counter","_summary"] if c in out.columns], inplace=True, errors="ignore")
-    out.to_parquet(events_out, index=False)
-    print(f"[OK] events(detail-enriched) saved: {events_out}, rows={len(out)}")
+    try:
+        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+            for i, (rcp, (a, c, s)) in enumerate(zip(keys, ex.map(try_enrich_one, keys)), 1):
+                enriched[rcp] = {"amount": a, "counterparty": c, "summary": s}
+                if i % PROGRESS_EVERY == 0:
+                    print(f"[INFO] detail progress {i}/{len(keys)} ({i/len(keys):.1%})")
+    finally:
+        client.close()
+
+    # 병합(기존 값이 있으면 유지): rcp_no → 보강값을 컬럼 단위로 map, 비어 있는 칸만 채움
+    enr = pd.DataFrame.from_dict(enriched, orient="index", columns=ENRICH_COLUMNS)
+    rcp = df["rcp_no"].astype(str)
+    for c in ENRICH_COLUMNS:
+        add = rcp.map(enr[c])
+        if c not in df.columns:
+            df[c] = add
+            continue
+        cur = df[c]
+        df[c] = cur.where(cur.notna() & (cur != ""), add)
+
+    _save_events(df, events_in, events_out)
+    print(f"[OK] events(detail-enriched) saved: {events_out}, rows={len(df)}")
@@ -1,9 +1,10 @@
 import os
 import math
-import time
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from common.dart_client import DartClient
 
@@ -19,14 +20,34 @@ REPRT_CODES = [
 ]
 FS_DIV_PRIORITY = ["CFS", "OFS"]  # 연결 우선, 안되면 별도
 PAGE_COUNT = 100  # OpenDART 페이지 사이즈
-SLEEP_SEC = 0.15  # 요청 간 간격(레이트리밋 회피)
-CHECKPOINT_EVERY = 2000  # N건마다 중간 저장
-OUT_COLUMNS = [
-    "corp_code", "fiscal_year", "reprt_code", "fs_div",
-    "revenue", "op_income", "net_income",
-    "total_assets", "total_liab", "equity",
-    "ocf", "fcf"
-]
+SLEEP_SEC = 0.15  # 재시도 백오프 기준 간격(요청률 제한은 DartClient 토큰 버킷)
+ROW_GROUP_SIZE = 50_000  # N건 모일 때마다 row group 하나로 기록(중간 저장 겸용)
+BATCH_SIZE = 200  # 한 번에 동시 요청할 (회사, 연도) 작업 수
+MAX_WORKERS = 8   # 동시 요청 스레드 수(DartClient 커넥션 풀 이하)
+# 출력 스키마 고정(pandas object 컬럼 추론 없이 dtype 확정)
+SCHEMA = pa.schema([
+    ("corp_code", pa.string()),
+    ("fiscal_year", pa.int16()),
+    ("reprt_code", pa.string()),
+    ("fs_div", pa.string()),
+    ("revenue", pa.float64()),
+    ("op_income", pa.float64()),
+    ("net_income", pa.float64()),
+    ("total_assets", pa.float64()),
+    ("total_liab", pa.float64()),
+    ("equity", pa.float64()),
+    ("ocf", pa.float64()),
+    ("fcf", pa.float64()),
+])
+OUT_COLUMNS = SCHEMA.names
+# fiscal_year 기준 hive 파티션(out_path/fiscal_year=YYYY/part-0.parquet)으로 저장.
+# 파티션 키는 디렉터리명에 있으므로 파일 스키마에서는 제외.
+PARTITION_COL = "fiscal_year"
+FILE_SCHEMA = SCHEMA.remove(SCHEMA.get_field_index(PARTITION_COL))
+WRITE_OPTIONS = dict(
+    compression="zstd", compression_level=3,
+    use_dictionary=["corp_code", "reprt_code", "fs_div"],  # 저카디널리티 문자열만 사전 인코딩
+)
 
 # 계정명 매핑(여러 명칭 대응)
 ACCOUNT_MAP = {
@@ -39,26 +60,17 @@ ACCOUNT_MAP = {
     "ocf": {"영업활동현금흐름"},
     # FCF는 공시 표준 계정이 아님(보통 OCF - CapEx로 추정). 여기선 None 유지.
 }
+# 별칭 → 지표 키 역매핑(별칭은 지표 간에 겹치지 않음): 계정 테이블을 한 번의 map으로 태깅
+ALIAS_TO_KEY = {alias: key for key, aliases in ACCOUNT_MAP.items() for alias in aliases}
 
-def _to_number(x: Optional[str]) -> Optional[float]:
+def _to_numbers(s: pd.Series) -> pd.Series:
     """
-    "1,234", "(1,234)" 등 문자열 금액을 부호 포함 float로 변환.
+    "1,234", "(1,234)" 등 문자열 금액 컬럼을 부호 포함 float로 일괄 변환(빈값/"-"/형식 오류는 NaN).
     """
-    if x is None:
-        return None
-    s = str(x).strip()
-    if s == "" or s == "-":
-        return None
-    neg = False
-    if s.startswith("(") and s.endswith(")"):
-        neg = True
-        s = s[1:-1]
-    s = s.replace(",", "")
-    try:
-        v = float(s)
-        return -v if neg else v
-    except Exception:
-        return None
+    s = s.astype("string").str.strip()
+    neg = (s.str.startswith("(") & s.str.endswith(")")).fillna(False).to_numpy(dtype=bool)
+    v = pd.to_numeric(s.str.replace(r"[(),]", "", regex=True), errors="coerce").astype("float64")
+    return v.where(~neg, -v)
 
 def _normalize_row(df_accounts: pd.DataFrame) -> Dict[str, Optional[float]]:
     """
@@ -72,12 +84,12 @@ def _normalize_row(df_accounts: pd.DataFrame) -> Dict[str, Optional[float]]:
     # account_nm 컬럼을 표준화 후 매핑
     names = df_accounts["account_nm"].astype(str).str.replace("\u3000", " ", regex=False).str.strip()
 
-    for key, aliases in ACCOUNT_MAP.items():
-        # 여러 행 중 첫 매칭 우선
-        mask = names.isin(aliases)
-        if mask.any():
-            val = df_accounts.loc[mask, "thstrm_amount"].iloc[0]
-            out[key] = _to_number(val)
+    # 지표별 isin 반복 대신 한 번의 map으로 태깅 → 지표별 첫 매칭 행만 남김
+    mk = names.map(ALIAS_TO_KEY)
+    hit = mk.notna().to_numpy()
+    first = pd.DataFrame({"_m": mk[hit], "v": df_accounts["thstrm_amount"][hit]}).drop_duplicates("_m", keep="first")
+    nums = _to_numbers(first["v"])
+    out.update((k, None if pd.isna(v) else float(v)) for k, v in zip(first["_m"], nums))
 
     # equity 대체 로직(자본총계가 없고 자산/부채가 있으면 자산-부채로 보정 시도)
     if out["equity"] is None and out["total_assets"] is not None and out["total_liab"] is not None:
@@ -88,29 +100,29 @@ def _normalize_row(df_accounts: pd.DataFrame) -> Dict[str, Optional[float]]:
 
     return out
 
-def _fetch_single_fs(client: DartClient, corp_code: str, year: int,
-                     reprt_code: str, fs_div: str) -> pd.DataFrame:
+def _fs_params(corp_code: str, year: int, reprt_code: str, fs_div: str, page_no: int = 1) -> Dict:
+    return {
+        "corp_code": corp_code,
+        "bsns_year": str(year),
+        "reprt_code": reprt_code,
+        "fs_div": fs_div,      # CFS=연결, OFS=별도
+        "page_no": page_no,
+        "page_count": PAGE_COUNT
+    }
+
+def _collect_fs_pages(client: DartClient, first: Dict, corp_code: str, year: int,
+                      reprt_code: str, fs_div: str) -> pd.DataFrame:
     """
-    단일 회사/연도/보고서/구분에 대한 주요계정 테이블 호출(페이지 순회 포함).
+    첫 페이지 응답(first)을 받아 남은 페이지를 순회 수집.
     반환: 해당 조건의 전체 계정 rows(DataFrame)
     """
     all_pages = []
     page_no = 1
+    j = first
     while True:
-        j = client.get("fnlttSinglAcntAll", {
-            "corp_code": corp_code,
-            "bsns_year": str(year),
-            "reprt_code": reprt_code,
-            "fs_div": fs_div,      # CFS=연결, OFS=별도
-            "page_no": page_no,
-            "page_count": PAGE_COUNT
-        })
         status = str(j.get("status", ""))
-        if status != "013":  # 013: 조회된 데이터가 없습니다 (정상 무데이터). '000'이 정상 데이터.
-            # pass; 대부분 "000" 이거나 "013"
-            pass
         if status not in {"000", "013"}:
-            # 기타 에러는 빈 DF로 처리(상태 코드 다양성 때문)
+            # 기타 에러는 빈 DF로 처리(상태 코드 다양성 때문). 013: 조회된 데이터 없음(정상 무데이터)
             break
 
         list_data = j.get("list", [])
@@ -125,56 +137,73 @@ def _fetch_single_fs(client: DartClient, corp_code: str, year: int,
         if page_no >= max_page:
             break
         page_no += 1
-        time.sleep(SLEEP_SEC)
+        j = client.get("fnlttSinglAcntAll", _fs_params(corp_code, year, reprt_code, fs_div, page_no))
 
     if not all_pages:
         return pd.DataFrame(columns=["account_nm","thstrm_amount"])
     out = pd.concat(all_pages, ignore_index=True)
     # 필요한 컬럼만 유지
     keep = [c for c in out.columns if c in {"account_nm","thstrm_amount"}]
-    return out[keep].copy()
+    return out[keep]  # 컬럼 선택이 이미 새 프레임 → 추가 복사 불필요
+
+def _to_out_row(df_raw: pd.DataFrame, corp_code: str, year: int,
+                reprt_code: str, fs_div: str) -> Optional[Dict]:
+    """계정 테이블을 표준화. 핵심 3종이 하나도 없으면 None(무의미한 결과)."""
+    if df_raw.empty:
+        return None
+    metrics = _normalize_row(df_raw)
+    if not any(metrics.get(k) is not None for k in ("revenue","op_income","net_income")):
+        return None
+    return {
+        "corp_code": corp_code,
+        "fiscal_year": year,
+        "reprt_code": reprt_code,
+        "fs_div": fs_div,
+        **metrics
+    }
 
-def _fetch_one_company_year(client: DartClient, corp_code: str, year: int) -> List[Dict]:
+def _fetch_company_years(client: DartClient, tasks: List[Tuple[str, int]]) -> List[Dict]:
     """
-    회사+연도에 대해 REPRT_CODES × FS_DIV_PRIORITY 순서로 조회하여
-    첫 유의미 결과를 표준화한 1~N행으로 반환(보통 사업보고서 1행).
+    (회사, 연도) 목록에 대해 REPRT_CODES × FS_DIV_PRIORITY 순서로 조회하여
+    첫 유의미 결과를 표준화한 행들을 반환(보통 회사-연도당 사업보고서 1행).
+    우선순위 단계마다 아직 못 찾은 작업 전체의 첫 페이지를 get_many로 동시에 요청하고,
+    찾은 건은 다음 단계에서 제외(사업보고서에서 확보되면 다른 보고서는 생략).
     """
-    rows = []
+    rows: List[Dict] = []
+    pending = list(tasks)
     for reprt_code in REPRT_CODES:
-        found = False
         for fs_div in FS_DIV_PRIORITY:
-            df_raw = _fetch_single_fs(client, corp_code, year, reprt_code, fs_div)
-            if df_raw.empty:
-                continue
-            metrics = _normalize_row(df_raw)
-            # 핵심 3종이라도 있으면 유의미한 것으로 간주
-            if any(metrics.get(k) is not None for k in ("revenue","op_income","net_income")):
-                row = {
-                    "corp_code": corp_code,
-                    "fiscal_year": year,
-                    "reprt_code": reprt_code,
-                    "fs_div": fs_div,
-                    **metrics
-                }
-                rows.append(row)
-                found = True
-                break
-        # 사업보고서(연간)에서 이미 확보되면 다음 보고서들은 생략(중복 방지)
-        if found:
-            break
+            if not pending:
+                return rows
+            calls = [("fnlttSinglAcntAll", _fs_params(c, y, reprt_code, fs_div)) for c, y in pending]
+            firsts = client.get_many(calls, max_workers=MAX_WORKERS)
+            still = []
+            for (corp_code, year), first in zip(pending, firsts):
+                try:
+                    df_raw = _collect_fs_pages(client, first, corp_code, year, reprt_code, fs_div)
+                except Exception as e:
+                    # 개별 회사 에러는 스킵(로그만 콘솔)
+                    print(f"[WARN] fail corp={corp_code} year={year}: {e}")
+                    continue
+                row = _to_out_row(df_raw, corp_code, year, reprt_code, fs_div)
+                if row:
+                    rows.append(row)
+                else:
+                    still.append((corp_code, year))
+            pending = still
     return rows
 
-def _load_corp_master(path: str) -> pd.DataFrame:
+def _load_corp_master(path: str, columns: Sequence[str] = ("corp_code",)) -> pd.DataFrame:
     if not os.path.exists(path):
         raise FileNotFoundError(
             f"corp_master not found: {path}. 먼저 `python run_pipeline.py bootstrap` 실행하세요."
         )
-    df = pd.read_parquet(path)
-    # 최소 필드 보장
-    need = {"corp_code","corp_name","stock_code","is_listed"}
-    missing = need.difference(df.columns)
-    for m in missing:
-        df[m] = None
+    # 필요한 컬럼만 읽음(파케이 컬럼 프로젝션). 파일에 없는 컬럼은 None으로 채움
+    have = set(pq.read_schema(path).names)
+    df = pd.read_parquet(path, columns=[c for c in columns if c in have])
+    for m in columns:
+        if m not in df.columns:
+            df[m] = None
     return df
 
 def backfill_financials(env: dict, start_year: int, end_year: int, out_path: str):
@@ -182,68 +211,58 @@ def backfill_financials(env: dict, start_year: int, end_year: int, out_path: str
     전체 회사(상장/비상장 포함) × 연도 루프.
     - 연결(CFS) 우선, 불가 시 별도(OFS)로 대체
     - 사업보고서(연간) 우선
-    - 중간 체크포인트 저장
+    - (회사, 연도) 작업을 BATCH_SIZE 단위로 묶어 동시 요청
+    - 결과는 연도 파티션별 ParquetWriter로 ROW_GROUP_SIZE마다 스트리밍 기록
+      (하류에서 filters=[("fiscal_year","=",year)]로 해당 연도 파일만 읽음)
+    - 재실행 시 해당 연도 파티션만 덮어쓰고 다른 연도는 유지
     """
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    client = DartClient(env["DART_API_KEY"], sleep_sec=SLEEP_SEC)
+    # 예전 단일 파일 출력이 남아 있으면 파티션 디렉터리로 교체
+    if os.path.isfile(out_path):
+        os.remove(out_path)
+    os.makedirs(out_path, exist_ok=True)
 
     # 회사 마스터 로드
     corp_master_path = "data/corp_master.parquet"
     dim = _load_corp_master(corp_master_path)
+    # (회사, 연도) 작업 키가 유일하도록 corp_code 중복 제거(순서 유지) → 출력 키 중복은 구성상 발생하지 않음
+    corp_codes = list(dict.fromkeys(dim["corp_code"].astype(str)))
 
-    # 반복 준비
-    all_rows: List[Dict] = []
-    total_tasks = len(dim) * (end_year - start_year + 1)
+    total_tasks = len(corp_codes) * (end_year - start_year + 1)
     done = 0
+    written = 0
+
+    with DartClient(env["DART_API_KEY"], sleep_sec=SLEEP_SEC) as client:
+        for year in range(start_year, end_year + 1):
+            part_dir = os.path.join(out_path, f"{PARTITION_COL}={year}")
+            os.makedirs(part_dir, exist_ok=True)
+            tasks = [(c, year) for c in corp_codes]
+            pending: List[Dict] = []
+
+            # 예외로 중단돼도 with 블록이 footer를 써서 그때까지의 row group은 읽을 수 있음
+            with pq.ParquetWriter(os.path.join(part_dir, "part-0.parquet"), FILE_SCHEMA, **WRITE_OPTIONS) as writer:
+                for start in range(0, len(tasks), BATCH_SIZE):
+                    batch = tasks[start:start + BATCH_SIZE]
+                    pending.extend(_fetch_company_years(client, batch))
+
+                    done += len(batch)
+                    print(f"[INFO] progress {done}/{total_tasks} ({done/total_tasks:.1%})")
+
+                    if len(pending) >= ROW_GROUP_SIZE:
+                        written += _write_checkpoint(writer, pending)
+                        pending = []
+
+                # 연도 파티션 마감
+                written += _write_checkpoint(writer, pending)
+
+    print(f"[OK] financials saved: {out_path}, rows={written}")
 
-    for year in range(start_year, end_year + 1):
-        for _, r in dim.iterrows():
-            corp_code = str(r["corp_code"])
-            try:
-                rows = _fetch_one_company_year(client, corp_code, year)
-                if rows:
-                    all_rows.extend(rows)
-            except Exception as e:
-                # 개별 회사 에러는 스킵(로그만 콘솔)
-                print(f"[WARN] fail corp={corp_code} year={year}: {e}")
-
-            done += 1
-            if done % 200 == 0:
-                print(f"[INFO] progress {done}/{total_tasks} ({done/total_tasks:.1%})")
-
-            if done % CHECKPOINT_EVERY == 0:
-                _write_checkpoint(all_rows, out_path, mode="ab")
-
-    # 최종 저장
-    _write_checkpoint(all_rows, out_path, mode="wb")
-    print(f"[OK] financials saved: {out_path}")
-
-def _write_checkpoint(rows: List[Dict], out_path: str, mode: str = "wb"):
+def _write_checkpoint(writer: pq.ParquetWriter, rows: List[Dict]) -> int:
     """
-    누적 rows를 파케이로 저장(헤더 스키마를 OUT_COLUMNS에 맞춤).
-    mode:
-      - "wb": 새로쓰기(최종 저장)
-      - "ab": 중간체크포인트(기존 파일 있으면 append 형태로 병합 저장)
+    누적 rows를 FILE_SCHEMA 타입의 RecordBatch로 변환해 row group으로 추가 기록.
+    (회사, 연도)당 최대 1행이라 키 중복이 생기지 않으므로 기존 파일을 다시 읽어 병합하지 않음.
+    반환: 기록한 행 수
     """
     if not rows:
-        # 빈 데이터라도 스키마 헤더 유지를 위해 빈 DF 저장
-        if not os.path.exists(out_path):
-            pd.DataFrame(columns=OUT_COLUMNS).to_parquet(out_path, index=False)
-        return
-
-    df = pd.DataFrame(rows)
-    # 컬럼 정렬/보정
-    for c in OUT_COLUMNS:
-        if c not in df.columns:
-            df[c] = None
-    df = df[OUT_COLUMNS]
-
-    if mode == "wb" or not os.path.exists(out_path):
-        df.to_parquet(out_path, index=False)
-    else:
-        # 기존과 병합 저장
-        old = pd.read_parquet(out_path) if os.path.exists(out_path) else pd.DataFrame(columns=OUT_COLUMNS)
-        merged = pd.concat([old, df], ignore_index=True)
-        # 중복 제거(동일 키 우선순위: 나중 것 우선)
-        merged.drop_duplicates(subset=["corp_code","fiscal_year","reprt_code","fs_div"], keep="last", inplace=True)
-        merged.to_parquet(out_path, index=False)
+        return 0
+    writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=FILE_SCHEMA), row_group_size=ROW_GROUP_SIZE)
+    return len(rows)
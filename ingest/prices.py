@@ -2,21 +2,49 @@ import os
 import math
 import time
 import datetime as dt
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import yfinance as yf
 
 from common.dart_client import DartClient
 
 PAGE_COUNT = 100
 SLEEP_SEC = 0.15
+YF_BATCH = 200  # yf.download 한 번에 요청할 티커 수
+MAX_WORKERS = 8  # DART 동시 요청 스레드 수(DartClient 커넥션 풀 이하)
+WRITE_BATCH = 1000  # 스냅샷 파케이 row group 크기(행 수)
 
-OUT_COLUMNS = [
-    "corp_code", "stock_code", "date_ref",
-    "shares_outstanding", "close_px", "ccy",
-    "mcap_local", "mcap_krw", "price_source", "ticker_used", "note"
-]
+# 재실행 시 네트워크 생략용 파케이 캐시(data/cache). 이미 끝난 가격 창의 종가는 값이 바뀌지 않으므로 만료 없음,
+# 진행 중인 창과 "데이터 없음" 기록(일시 실패일 수 있음)은 TTL 적용.
+# 주식수는 사업보고서 제출기한(다음 해 3월 말) 이후 조회값만 확정, 그 전 조회값(분기/반기 기준일 수 있음)은 TTL
+CACHE_DIR = "data/cache"
+PRICE_CACHE_TTL_SEC = 24 * 3600
+SHARES_CACHE_TTL_SEC = 30 * 24 * 3600
+
+# 출력 스키마 고정(빈 결과도 같은 dtype으로 저장 → 하류에서 object 컬럼 재추론 없음)
+SCHEMA = pa.schema([
+    ("corp_code", pa.string()),
+    ("stock_code", pa.string()),
+    ("date_ref", pa.date32()),
+    ("shares_outstanding", pa.int64()),
+    ("close_px", pa.float64()),
+    ("ccy", pa.string()),
+    ("mcap_local", pa.float64()),
+    ("mcap_krw", pa.float64()),
+    ("price_source", pa.string()),
+    ("ticker_used", pa.string()),
+    ("note", pa.string()),
+])
+OUT_COLUMNS = SCHEMA.names
+# 저장 옵션: zstd + 저카디널리티 문자열만 사전 인코딩
+WRITE_OPTIONS = dict(
+    compression="zstd", compression_level=3,
+    use_dictionary=["ccy", "price_source", "note"],
+)
 
 # ---- DART: 주식의 총수 현황(stockTotqySttus) 헬퍼 -----------------
 # 참고: 회사/연도 기준으로 보통주 발행주식수(유통/자기주식 제외 포함 여부는 공시 항목에 따름)
@@ -42,42 +70,71 @@ def _to_int(x) -> Optional[int]:
     except:
         return None
 
+def _shares_params(corp_code: str, year: int) -> Dict:
+    return {"corp_code": corp_code, "bsns_year": str(year)}
+
+def _to_ints(raw: pd.Series) -> np.ndarray:
+    """_to_int의 벡터 버전: 콤마 제거 후 한 번에 숫자 변환(빈값/"-"/파싱 실패는 NaN), 소수점 이하 버림."""
+    s = raw.astype(str).str.strip().str.replace(",", "", regex=False)
+    return np.trunc(pd.to_numeric(s, errors="coerce").to_numpy(dtype=float))
+
+def _share_candidates(j: Dict) -> List:
+    """응답에서 주식수 후보 원값을 우선순위 순서로(최신 보고서 → SHARE_KEYS 순)."""
+    # 일부 시점/회사에서 status=013(없음)일 수 있음 → 후보 없음
+    if str(j.get("status","")) != "000":
+        return []
+    lst = j.get("list", [])
+    if not lst:
+        return []
+    # 최신 보고서 우선: rcept_dt/rcept_no 오름차순 정렬(뒤쪽이 최신) — 행이 몇 개뿐이라 DataFrame 없이 리스트로
+    rows = sorted(lst, key=lambda r: (r.get("rcept_dt") or "", r.get("rcept_no") or ""))
+    return [row[key] for row in reversed(rows) for key in SHARE_KEYS if row.get(key) is not None]
+
+def _shares_from_response(j: Dict) -> Optional[int]:
+    """stockTotqySttus 응답에서 보통주 발행주식수 추정(최신 보고서 우선). 없으면 None."""
+    # 후보 키 중 첫 유효값(양수)
+    for v in _share_candidates(j):
+        val = _to_int(v)
+        if val and val > 0:
+            return val
+    return None
+
 def fetch_shares_outstanding(client: DartClient, corp_code: str, year: int) -> Optional[int]:
     """
     stockTotqySttus: 특정 연도의 주식총수 현황을 조회하여 보통주 발행주식수를 추정.
     연말 스냅샷이 목적이므로 해당 연도의 가장 최신(분기/반기/사업) 값을 선택.
     """
     # reprt_code를 신경쓰지 않는 버전: list/endpoints에 따라 여러 로우가 오면 최신을 씀.
-    # 일부 시점/회사에서 status=013(없음)일 수 있음 → None 반환
     try:
-        j = client.get("stockTotqySttus", {
-            "corp_code": corp_code,
-            "bsns_year": str(year),
-        })
+        j = client.get("stockTotqySttus", _shares_params(corp_code, year))
     except Exception:
         return None
+    return _shares_from_response(j)
 
-    if str(j.get("status","")) != "000":
-        return None
-
-    lst = j.get("list", [])
-    if not lst:
-        return None
-
-    # 최신 보고서(접수일자/보고서구분) 우선 정렬
-    df = pd.DataFrame(lst)
-    # 안전을 위해 rcept_no 혹은 rcept_dt가 있으면 그것으로 정렬
-    sort_cols = [c for c in ["rcept_dt", "rcept_no"] if c in df.columns]
-    if sort_cols:
-        df = df.sort_values(sort_cols, ascending=True)  # 뒤쪽이 최신일 수 있음
-    # 후보 키 중 첫 유효값 찾기(뒤에서부터 찾음 = 최신 우선)
-    for _, row in df.iloc[::-1].iterrows():
-        for key in SHARE_KEYS:
-            if key in row and row[key] is not None:
-                val = _to_int(row[key])
-                if val and val > 0:
-                    return val
-    return None
+def fetch_shares_many(client: DartClient, corp_codes: List[str], year: int) -> Dict[str, Optional[int]]:
+    """
+    여러 회사의 발행주식수를 DartClient.get_many로 동시 조회(요청률은 클라이언트 토큰 버킷이 제한).
+    개별 실패는 get_many가 빈 dict로 채우므로 None이 됨.
+    반환: {corp_code: shares}
+    """
+    resps = client.get_many([("stockTotqySttus", _shares_params(c, year)) for c in corp_codes],
+                            max_workers=MAX_WORKERS)
+    # 모든 응답의 후보 원값을 한 컬럼으로 모아 한 번에 숫자 변환(값마다 _to_int 호출 없음)
+    owner, raw = [], []
+    for i, j in enumerate(resps):
+        vals = _share_candidates(j)
+        owner.extend([i] * len(vals))
+        raw.extend(vals)
+    out: Dict[str, Optional[int]] = dict.fromkeys(corp_codes)
+    if not raw:
+        return out
+    nums = _to_ints(pd.Series(raw, dtype=object))
+    ok = nums > 0
+    # 회사별 첫 유효값 = 우선순위가 가장 높은 후보(np.unique는 첫 등장 위치를 돌려줌)
+    owners, first = np.unique(np.asarray(owner)[ok], return_index=True)
+    for i, v in zip(owners, nums[ok][first]):
+        out[corp_codes[i]] = int(v)
+    return out
 
 # ---- 가격(yfinance) 수집 -----------------
 
@@ -93,53 +150,159 @@ def _guess_yahoo_ticker(stock_code: str) -> List[str]:
     # 우선순위: KS → KQ
     return [f"{base}.KS", f"{base}.KQ"]
 
-def fetch_close_price_yahoo(ticker_candidates: List[str], date_ref: dt.date) -> Tuple[Optional[float], Optional[str], str]:
+def _price_window(date_ref: dt.date) -> Tuple[str, str]:
+    # 2주 범위로 완충(yfinance end는 배타적이라 +1일)
+    start = date_ref - dt.timedelta(days=21)
+    end = date_ref + dt.timedelta(days=7)
+    return start.isoformat(), (end + dt.timedelta(days=1)).isoformat()
+
+def _cache_fresh(path: str, immutable: bool, ttl_sec: float) -> bool:
+    if not os.path.exists(path):
+        return False
+    return immutable or (time.time() - os.path.getmtime(path)) < ttl_sec
+
+def _write_cache(df: pd.DataFrame, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_parquet(path, index=False, compression="zstd")
+
+def _as_close_arrays(dates, close) -> Tuple[np.ndarray, np.ndarray]:
+    """(날짜, 종가) → 날짜순 (datetime64[D] 배열, float 배열). 조회는 searchsorted로."""
+    d = np.asarray(pd.DatetimeIndex(dates).values.astype("datetime64[D]"))
+    v = np.asarray(close, dtype=float)
+    order = np.argsort(d, kind="stable")
+    return d[order], v[order]
+
+def download_closes(tickers: List[str], date_ref: dt.date) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    티커 목록의 date_ref 전후 종가를 YF_BATCH개씩 묶어 한 번의 yf.download로 받음(내부 스레드 사용).
+    (창, 티커) 단위로 data/cache에 캐시: 캐시에 있는 티커는 다시 받지 않음.
+    단, 데이터 없음(null) 기록은 yf.download가 티커별 실패(요청 제한/타임아웃)를 예외 없이 NaN으로 돌려줄 수 있어
+    창이 끝났어도 PRICE_CACHE_TTL_SEC가 지나면 버리고 다시 받음.
+    반환: {ticker: (날짜순 datetime64[D] 배열, 종가 배열)} (데이터 없는 티커는 제외)
+    """
+    start, end = _price_window(date_ref)
+    path = os.path.join(CACHE_DIR, f"yahoo_close_{start}_{end}.parquet")
+    cached = None
+    if _cache_fresh(path, end <= dt.date.today().isoformat(), PRICE_CACHE_TTL_SEC):
+        cached = pd.read_parquet(path)
+
+    now = time.time()
+    closes: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    tried = set()
+    if cached is not None:
+        # 만료된 데이터 없음 기록 제거(fetched_at이 없는 예전 캐시는 만료로 간주) → 아래 todo로 재시도, 재기록 시 교체
+        ts = (np.nan_to_num(cached["fetched_at"].to_numpy(dtype=float, na_value=np.nan))
+              if "fetched_at" in cached.columns else np.zeros(len(cached)))
+        stale_miss = cached["close"].isna().to_numpy() & (now - ts >= PRICE_CACHE_TTL_SEC)
+        cached = cached[~stale_miss]
+        tried = set(cached["ticker"])
+        hit = cached.dropna(subset=["close"])
+        for t, g in hit.groupby("ticker", sort=False):
+            closes[t] = _as_close_arrays(g["date"], g["close"])
+
+    todo = [t for t in dict.fromkeys(tickers) if t not in tried]
+    fresh = []  # 이번에 받은 (ticker, date, close); 응답은 왔지만 데이터가 없는 티커는 date/close null로 기록
+    for i in range(0, len(todo), YF_BATCH):
+        batch = todo[i:i + YF_BATCH]
+        try:
+            df = yf.download(batch, start=start, end=end, group_by="ticker", threads=True,
+                             progress=False, auto_adjust=False)
+        except Exception as e:
+            print(f"[WARN] yahoo batch fail {i}~{i + len(batch)}: {e}")
+            continue  # 실패 배치는 캐시에 남기지 않음(다음 실행에서 재시도)
+        for t in batch:
+            px = None
+            if df is not None and not df.empty:
+                try:
+                    px = df[t]["Close"].dropna()
+                except KeyError:
+                    px = None
+            if px is not None and not px.empty:
+                closes[t] = _as_close_arrays(px.index, px.to_numpy())
+                fresh.append(pd.DataFrame({"ticker": t, "date": px.index, "close": px.to_numpy(), "fetched_at": now}))
+            else:
+                fresh.append(pd.DataFrame({"ticker": [t], "date": [pd.NaT], "close": [float("nan")], "fetched_at": [now]}))
+        print(f"[INFO] yahoo batch {min(i + YF_BATCH, len(todo))}/{len(todo)} (cached={len(tried)})")
+
+    if fresh:
+        _write_cache(pd.concat(([cached] if cached is not None else []) + fresh, ignore_index=True), path)
+    return closes
+
+def fetch_close_price_yahoo(ticker_candidates: List[str], date_ref: dt.date,
+                            closes: Optional[Dict[str, Tuple[np.ndarray, np.ndarray]]] = None) -> Tuple[Optional[float], Optional[str], str]:
     """
     주어진 날짜(date_ref)의 '가까운 영업일' 종가를 시도해서 가져옴.
     - date_ref ± 14 영업일 범위에서 최종 종가를 찾음
+    - closes(download_closes 결과)를 주면 네트워크 없이 그 안에서 조회
     반환: (close_px, ticker_used, note)
     """
     if not ticker_candidates:
         return (None, None, "no_ticker_candidate")
+    if closes is None:
+        closes = download_closes(ticker_candidates, date_ref)
 
-    # 2주 범위로 완충
-    start = date_ref - dt.timedelta(days=21)
-    end = date_ref + dt.timedelta(days=7)
-
+    ref = np.datetime64(date_ref, "D")
     for t in ticker_candidates:
-        try:
-            df = yf.download(t, start=start.isoformat(), end=(end + dt.timedelta(days=1)).isoformat(), progress=False, auto_adjust=False)
-            if df is None or df.empty:
-                continue
-            # date_ref에 가장 가까운 과거 영업일 종가
-            df = df.sort_index()
-            df_before = df[df.index.date <= date_ref]
-            if df_before.empty:
-                # 직후 영업일로 대체
-                df_after = df[df.index.date > date_ref]
-                if df_after.empty:
-                    continue
-                px = float(df_after["Close"].iloc[0])
-                note = "after_ref"
-            else:
-                px = float(df_before["Close"].iloc[-1])
-                note = "on_or_before_ref"
-            return (px, t, note)
-        except Exception:
+        hit = closes.get(t)
+        if hit is None:
             continue
+        dates, px = hit
+        # date_ref에 가장 가까운 과거 영업일 종가(정렬된 날짜 배열에서 이진 탐색)
+        pos = int(np.searchsorted(dates, ref, side="right")) - 1
+        if pos >= 0:
+            return (float(px[pos]), t, "on_or_before_ref")
+        # 직후 영업일로 대체
+        return (float(px[0]), t, "after_ref")
     return (None, None, "no_price_found")
 
 # ---- 스냅샷 빌더 -----------------
 
-def _load_corp_master(path: str) -> pd.DataFrame:
+def _shares_cached(env: dict, corp_codes: List[str], year: int) -> Dict[str, Optional[int]]:
+    """
+    data/cache/shares_{year}.parquet(corp_code → shares)를 먼저 보고, 없는 회사만 DART에서 조회해 캐시에 추가.
+    값을 못 찾은 회사(None)는 캐시하지 않음(일시 오류일 수 있어 다음 실행에서 재시도).
+    행마다 조회 시각(fetched_at)을 기록: 사업보고서 제출기한 이후 조회값은 만료 없음, 그 전 값은 SHARES_CACHE_TTL_SEC.
+    """
+    path = os.path.join(CACHE_DIR, f"shares_{year}.parquet")
+    now = time.time()
+    # 결산 후 90일(다음 해 3월 말)까지 사업보고서 제출 → 그 이후 조회값은 연말 기준 확정값
+    final_ts = dt.datetime(year + 1, 4, 1).timestamp()
+    shares: Dict[str, Optional[int]] = {}
+    fetched_at: Dict[str, float] = {}
+    if os.path.exists(path):
+        c = pd.read_parquet(path)
+        # fetched_at이 없는 예전 캐시는 확정 여부를 알 수 없으므로 만료로 간주
+        ts = (np.nan_to_num(c["fetched_at"].to_numpy(dtype=float, na_value=np.nan))
+              if "fetched_at" in c.columns else np.zeros(len(c)))
+        keep = (ts >= final_ts) | (now - ts < SHARES_CACHE_TTL_SEC)
+        c = c[keep]
+        shares = dict(zip(c["corp_code"], c["shares"].astype(int).tolist()))
+        fetched_at = dict(zip(c["corp_code"], ts[keep].tolist()))
+
+    todo = [c for c in corp_codes if c not in shares]
+    if todo:
+        print(f"[INFO] shares fetch {len(todo)} (cached={len(shares)})")
+        with DartClient(env["DART_API_KEY"], sleep_sec=SLEEP_SEC) as client:
+            got = fetch_shares_many(client, todo, year)
+        new = {c: v for c, v in got.items() if v is not None}
+        if new:
+            shares.update(new)
+            fetched_at.update(dict.fromkeys(new, now))
+            _write_cache(pd.DataFrame({"corp_code": list(shares), "shares": list(shares.values()),
+                                       "fetched_at": [fetched_at[c] for c in shares]}), path)
+    return {c: shares.get(c) for c in corp_codes}
+
+def _load_corp_master(path: str, columns: Sequence[str] = ("corp_code",)) -> pd.DataFrame:
     if not os.path.exists(path):
         raise FileNotFoundError(
             f"corp_master not found: {path}. 먼저 `python run_pipeline.py bootstrap` 실행하세요."
         )
-    df = pd.read_parquet(path)
-    need = {"corp_code","corp_name","stock_code","is_listed"}
-    for m in need.difference(df.columns):
-        df[m] = None
+    # 필요한 컬럼만 읽음(파케이 컬럼 프로젝션). 파일에 없는 컬럼은 None으로 채움
+    have = set(pq.read_schema(path).names)
+    df = pd.read_parquet(path, columns=[c for c in columns if c in have])
+    for m in columns:
+        if m not in df.columns:
+            df[m] = None
     return df
 
 def build_mcap_snapshot(env: dict, date_ref: str, out_path: str):
@@ -151,7 +314,6 @@ def build_mcap_snapshot(env: dict, date_ref: str, out_path: str):
     저장: data/mcap_snapshot.parquet
     """
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    client = DartClient(env["DART_API_KEY"], sleep_sec=SLEEP_SEC)
 
     # 기준일 파싱
     try:
@@ -159,58 +321,54 @@ def build_mcap_snapshot(env: dict, date_ref: str, out_path: str):
     except Exception:
         raise ValueError("date_ref must be 'YYYY-MM-DD'")
 
-    df_corp = _load_corp_master("data/corp_master.parquet")
+    df_corp = _load_corp_master("data/corp_master.parquet", columns=("corp_code", "stock_code"))
     # 상장만 대상(국내 6자리 종목코드)
-    base = df_corp[df_corp["stock_code"].astype(str).str.len()==6].copy()
+    base = df_corp[df_corp["stock_code"].astype(str).str.len()==6]
     if base.empty:
-        # 파일은 만들어 둠
-        pd.DataFrame(columns=OUT_COLUMNS).to_parquet(out_path, index=False)
+        # 파일은 만들어 둠(pandas 거치지 않고 스키마만 있는 빈 테이블)
+        pq.write_table(SCHEMA.empty_table(), out_path, **WRITE_OPTIONS)
         print(f"[OK] mcap snapshot saved (empty): {out_path}")
         return
 
-    rows = []
+    # 가격: 전 종목 티커 후보를 모아 배치 다운로드 → 이후에는 메모리 조회만
+    tickers_by_code = {sc: _guess_yahoo_ticker(sc) for sc in base["stock_code"].astype(str).unique()}
+    closes = download_closes([t for ts in tickers_by_code.values() for t in ts], dref)
+
+    # 발행주식수(연도 기준): 캐시에 없는 회사만 동시 조회 → 이후에는 dict 조회만
     year = dref.year
-    for i, r in base.reset_index(drop=True).iterrows():
-        corp_code = str(r["corp_code"])
-        stock_code = str(r["stock_code"])
-
-        # 1) 발행주식수(연도 기준)
-        shares = fetch_shares_outstanding(client, corp_code, year)
-
-        # 2) 가격(yahoo)
-        tickers = _guess_yahoo_ticker(stock_code)
-        close_px, ticker_used, note = fetch_close_price_yahoo(tickers, dref)
-
-        # 3) 시총 계산(원화 가정)
-        ccy = "KRW"
-        if shares and close_px:
-            mcap_local = float(shares) * float(close_px)
-        else:
-            mcap_local = None
-
-        # 동일통화 가정이므로 mcap_krw = mcap_local
-        rows.append({
-            "corp_code": corp_code,
-            "stock_code": stock_code,
-            "date_ref": dref.isoformat(),
-            "shares_outstanding": shares,
-            "close_px": close_px,
-            "ccy": ccy,
-            "mcap_local": mcap_local,
-            "mcap_krw": mcap_local,
-            "price_source": "yahoo",
-            "ticker_used": ticker_used,
-            "note": note
-        })
-
-        if (i+1) % 200 == 0:
-            print(f"[INFO] mcap progress {i+1}/{len(base)} ({(i+1)/len(base):.1%})")
-
-    df = pd.DataFrame(rows)
-    # 컬럼 정렬
-    for c in OUT_COLUMNS:
-        if c not in df.columns:
-            df[c] = None
-    df = df[OUT_COLUMNS]
-    df.to_parquet(out_path, index=False)
-    print(f"[OK] mcap snapshot saved: {out_path}, rows={len(df)}")
+    corp_codes = base["corp_code"].astype(str).tolist()
+    shares_by_corp = _shares_cached(env, corp_codes, year)
+
+    # 행 dict 없이 컬럼 배열로 바로 구성
+    stock_codes = base["stock_code"].astype(str).tolist()
+    # 2) 가격(yahoo): 종목코드당 한 번만 조회 → 행 순서대로 펼침
+    px_by_code = {sc: fetch_close_price_yahoo(ts, dref, closes) for sc, ts in tickers_by_code.items()}
+    close_px, ticker_used, note = (list(c) for c in zip(*(px_by_code[sc] for sc in stock_codes)))
+    # 1) 발행주식수(연도 기준)
+    shares = [shares_by_corp[c] for c in corp_codes]
+
+    # 3) 시총 계산(원화 가정): 주식수·종가가 모두 있고 0이 아닐 때만, 곱셈은 배열 한 번(None → NaN)
+    shares_f = np.array(shares, dtype=float)
+    px_f = np.array(close_px, dtype=float)
+    with np.errstate(invalid="ignore"):
+        ok = (shares_f != 0) & (px_f != 0) & ~np.isnan(shares_f) & ~np.isnan(px_f)
+    mcap_local = np.where(ok, shares_f * px_f, np.nan)
+
+    n = len(corp_codes)
+    # 동일통화 가정이므로 mcap_krw = mcap_local (NaN은 from_pandas로 null)
+    mcap_arr = pa.array(mcap_local, pa.float64(), from_pandas=True)
+    table = pa.table({
+        "corp_code": pa.array(corp_codes, pa.string()),
+        "stock_code": pa.array(stock_codes, pa.string()),
+        "date_ref": pa.array([dref] * n, pa.date32()),
+        "shares_outstanding": pa.array(shares, pa.int64()),
+        "close_px": pa.array(close_px, pa.float64()),
+        "ccy": pa.array(["KRW"] * n, pa.string()),
+        "mcap_local": mcap_arr,
+        "mcap_krw": mcap_arr,
+        "price_source": pa.array(["yahoo"] * n, pa.string()),
+        "ticker_used": pa.array(ticker_used, pa.string()),
+        "note": pa.array(note, pa.string()),
+    }, schema=SCHEMA)
+    pq.write_table(table, out_path, row_group_size=WRITE_BATCH, **WRITE_OPTIONS)
+    print(f"[OK] mcap snapshot saved: {out_path}, rows={table.num_rows}")
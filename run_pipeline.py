@@ -1,12 +1,7 @@
 import argparse
 from common.config import load_env
-from ingest.corp_master import fetch_and_save_corp_master
-from ingest.fin_statements import backfill_financials
-from ingest.events import backfill_events
-from ingest.prices import build_mcap_snapshot
-from ingest.events_detail import enrich_events_detail
-from export.excel_book import build_excel_book
-from transform.gics_map import apply_gics_mapping
+# 단계별 모듈(pandas/pyarrow/yfinance/lxml/xlsxwriter 등)은 해당 명령 분기에서만 import
+# → --help나 가벼운 명령이 무거운 의존성 로드를 기다리지 않음
 
 def main():
     parser = argparse.ArgumentParser(
@@ -55,18 +50,25 @@ def main():
     env = load_env()
 
     if args.cmd == "bootstrap":
+        from ingest.corp_master import fetch_and_save_corp_master
         fetch_and_save_corp_master(env, args.out)
     elif args.cmd == "map_gics":
+        from transform.gics_map import apply_gics_mapping
         apply_gics_mapping(args.corp, args.out, mapping_csv=args.csv)
     elif args.cmd == "backfill_financials":
+        from ingest.fin_statements import backfill_financials
         backfill_financials(env, start_year=args.start, end_year=args.end, out_path=args.out)
     elif args.cmd == "backfill_events":
+        from ingest.events import backfill_events
         backfill_events(env, years=args.years, out_path=args.out)
     elif args.cmd == "enrich_events":
+        from ingest.events_detail import enrich_events_detail
         enrich_events_detail(env, events_in=args.inpath, events_out=args.out)
     elif args.cmd == "build_mcap":
+        from ingest.prices import build_mcap_snapshot
         build_mcap_snapshot(env, date_ref=args.date, out_path=args.out)
     elif args.cmd == "export_excel":
+        from export.excel_book import build_excel_book
         build_excel_book(
             env,
             fin_path=args.fin,
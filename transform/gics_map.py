@@ -1,5 +1,6 @@
 import os
 import re
+import numpy as np
 import pandas as pd
 
 # 권장 CSV 포맷(헤더):
@@ -8,7 +9,7 @@ import pandas as pd
 
 # ---- 한국어 키워드 → GICS 대략 매핑(초기 규칙) ----
 # 정확도 향상을 위해 CSV 매핑을 점차 채워나가세요.
-_RULES = [
+_RAW_RULES = [
     (r"반도체|파운드리|칩|메모리", ("Information Technology","Semiconductors & Semiconductor Equipment","Semiconductors","Semiconductors")),
     (r"소프트웨어|SaaS|솔루션|플랫폼|클라우드", ("Information Technology","Software & Services","Application Software","Application Software")),
     (r"인터넷|포털|플랫폼|게임", ("Communication Services","Media & Entertainment","Interactive Media & Services","Interactive Media & Services")),
@@ -26,13 +27,35 @@ _RULES = [
     (r"반도체장비|노광|검사장비", ("Information Technology","Semiconductors & Semiconductor Equipment","Semiconductor Equipment","Semiconductor Equipment")),
 ]
 
-def _rule_guess(name: str):
-    if not isinstance(name, str):
-        return None
-    for pat, gics in _RULES:
-        if re.search(pat, name, flags=re.I):
-            return gics
-    return None
+# 저장 옵션: zstd + 저카디널리티 문자열(GICS 분류/상장코드)만 사전 인코딩
+WRITE_OPTIONS = dict(
+    engine="pyarrow", compression="zstd", compression_level=3,
+    use_dictionary=["stock_code", "gics_sector", "gics_industry_group", "gics_industry", "gics_sub_industry"],
+)
+
+GICS_COLS = ["gics_sector","gics_industry_group","gics_industry","gics_sub_industry"]
+# import 시 한 번만 컴파일(대소문자 무시) → 호출마다 패턴 문자열로 정규식 캐시를 조회하지 않음
+_RULES = [(re.compile(pat, re.I), g) for pat, g in _RAW_RULES]
+# 규칙 순번 → GICS 4단계 (R, 4) 룩업 테이블
+_RULE_TABLE = np.array([g for _, g in _RULES], dtype=object)
+# 전체 규칙 합집합: 한 번의 스캔으로 어떤 규칙에도 안 걸리는 회사명(대부분)을 먼저 걸러냄
+_ANY_RULE = re.compile("|".join(f"(?:{pat})" for pat, _ in _RAW_RULES), re.I)
+
+def _rule_guess(names: pd.Series) -> pd.DataFrame:
+    """
+    회사명 Series → 규칙 기반 GICS 4개 컬럼(DataFrame, 같은 index). 매칭 없으면 None.
+    합집합 패턴으로 후보만 추린 뒤, 후보에 대해서만 규칙별 contains 마스크를 쌓고
+    행마다 첫 매칭 규칙(_RULES 순서 우선)을 골라 한 번에 조회.
+    """
+    names = names.fillna("").astype(str)
+    out = pd.DataFrame(None, index=names.index, columns=GICS_COLS, dtype=object)
+    cand = names[names.str.contains(_ANY_RULE, regex=True).to_numpy(dtype=bool)]
+    if cand.empty:
+        return out
+    hits = np.column_stack([cand.str.contains(pat, regex=True).to_numpy(dtype=bool)
+                            for pat, _ in _RULES])
+    out.loc[cand.index, GICS_COLS] = _RULE_TABLE[hits.argmax(axis=1)]
+    return out
 
 def apply_gics_mapping(corp_parquet: str, out_parquet: str, mapping_csv: str = None):
     if not os.path.exists(corp_parquet):
@@ -45,34 +68,34 @@ def apply_gics_mapping(corp_parquet: str, out_parquet: str, mapping_csv: str = N
             df[c] = None
 
     # 우선 CSV 매핑 적용(있는 경우)
-    gics_cols = ["gics_sector","gics_industry_group","gics_industry","gics_sub_industry"]
+    gics_cols = GICS_COLS
     for c in gics_cols:
         if c not in df.columns:
             df[c] = None
 
     if mapping_csv and os.path.exists(mapping_csv):
-        mapdf = pd.read_csv(mapping_csv, dtype=str).fillna("")
-        use_cols = ["corp_code"] + [c for c in gics_cols if c in mapdf.columns]
-        mapdf = mapdf[use_cols].drop_duplicates("corp_code")
-        df = df.merge(mapdf, on="corp_code", how="left", suffixes=("", "_map"))
-        for c in gics_cols:
-            df[c] = df[c+"_map"].where(df[c+"_map"].notna() & (df[c+"_map"]!=""), df[c])
-            if c+"_map" in df.columns: df.drop(columns=[c+"_map"], inplace=True)
+        # 빈 칸은 NaN으로 읽힘(fillna 없음) → CSV 값이 있는 칸만 기존 값을 덮어씀
+        mapdf = pd.read_csv(mapping_csv, dtype=str).drop_duplicates("corp_code").set_index("corp_code")
+        # corp_code로 행 정렬 + CSV에 없는 GICS 컬럼은 전부 NaN(기존 값 유지)
+        # object로 맞춤: reindex가 만든 빈 컬럼(float64 NaN)이 combine_first 뒤에도 float로 남으면
+        # 아래 update에서 문자열 대입이 실패(pandas 3: TypeError)
+        mapped = mapdf.reindex(index=df["corp_code"], columns=gics_cols).set_axis(df.index).astype(object)
+        df[gics_cols] = mapped.combine_first(df[gics_cols].astype(object)).astype(object)
 
     # 룰 기반 보정: 비어 있는 기업만 규칙으로 추정
     mask_need = df["gics_sector"].isna() | (df["gics_sector"]=="")
     if mask_need.any():
-        for idx in df[mask_need].index:
-            nm = df.at[idx, "corp_name"]
-            g = _rule_guess(nm)
-            if g:
-                df.at[idx, "gics_sector"] = g[0]
-                df.at[idx, "gics_industry_group"] = g[1]
-                df.at[idx, "gics_industry"] = g[2]
-                df.at[idx, "gics_sub_industry"] = g[3]
+        # 대상 행 전체를 규칙별 마스크로 한 번에 분류 → 매칭된 행의 4개 컬럼을 update로 한 번에 채움
+        guess = _rule_guess(df.loc[mask_need, "corp_name"])
+        df.update(guess[guess["gics_sector"].notna()])
+
+    # GICS 분류는 값 종류가 적음 → category로 저장(파케이 dictionary 타입으로 보존)
+    # 읽는 쪽 groupby/merge가 문자열 해시 대신 정수 코드로 동작하고 메모리도 줄어듦
+    for c in gics_cols:
+        df[c] = df[c].astype("category")
 
     out_dir = os.path.dirname(out_parquet)
     if out_dir:
         os.makedirs(out_dir, exist_ok=True)
-    df.to_parquet(out_parquet, index=False)
+    df.to_parquet(out_parquet, index=False, **WRITE_OPTIONS)
     print(f"[OK] GICS mapping applied → {out_parquet} (rows={len(df)})")
@@ -1,104 +1,176 @@
+import numpy as np
 import pandas as pd
 from typing import List, Tuple
 
 # level: "gics_sector" | "gics_industry_group" | "gics_industry" | "gics_sub_industry"
+# level/corp_code가 category dtype이어도 동작(observed=True: 빈 카테고리 그룹은 만들지 않음)
 
-def compute_profit_rate(df_fin: pd.DataFrame, dim: pd.DataFrame, level: str, year: int):
-    base = df_fin[df_fin["fiscal_year"].astype(str)==str(year)].merge(
-        dim[["corp_code", level]], on="corp_code", how="left"
-    )
+def _as_float(s: pd.Series) -> pd.Series:
+    # 스키마대로 저장된 파케이는 이미 float64 → 그대로 사용. object(레거시 파일)일 때만 파싱
+    if pd.api.types.is_numeric_dtype(s.dtype):
+        return s
+    return pd.to_numeric(s, errors="coerce")
+
+def _as_datetime(s: pd.Series) -> pd.Series:
+    # event_date/date_ref는 수집 단계에서 날짜로 저장 → 이미 datetime64면 파싱 생략(예전 문자열 파일만 파싱)
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s
+    return pd.to_datetime(s, errors="coerce")
+
+# 호출 측에서 한 번 계산해 두는 연도 컬럼명(add_year_column). 있으면 compute_*는 날짜를 다시 파싱하지 않음
+YEAR_COL = "y"
+
+def add_year_column(df: pd.DataFrame, date_col: str) -> pd.DataFrame:
+    """
+    df[date_col]의 연도를 df["y"]에 한 번만 계산해 둠(in-place, 파싱 실패/결측은 NaN).
+    같은 입력으로 여러 지표를 계산할 때 지표마다 날짜를 다시 파싱하지 않도록.
+    """
+    if date_col in df.columns:
+        df[YEAR_COL] = _as_datetime(df[date_col]).dt.year
+    return df
+
+def _year_values(df: pd.DataFrame, date_col: str) -> np.ndarray:
+    # 미리 계산된 "y"가 있으면 그대로, 없으면 date_col에서 연도 추출
+    if YEAR_COL in df.columns:
+        return df[YEAR_COL].to_numpy()
+    return _as_datetime(df[date_col]).dt.year.to_numpy()
+
+def _event_year_mask(df_events: pd.DataFrame, year: int):
+    # event_date의 연도 == year 인 행(파싱 실패/결측은 False)
+    return _year_values(df_events, "event_date") == int(year)
+
+def _top_n_order(values: np.ndarray, n: int) -> np.ndarray:
+    """
+    values 내림차순 상위 n개의 위치(정렬됨). NaN은 맨 뒤(sort_values(ascending=False)와 같은 규칙).
+    argpartition O(N) + 상위 n개만 정렬 O(n log n) → 전체 정렬 O(N log N) 대비 가벼움.
+    """
+    key = np.where(np.isnan(values), np.inf, -values)
+    if len(key) > n:
+        idx = np.argpartition(key, n - 1)[:n]
+    else:
+        idx = np.arange(len(key))
+    return idx[np.argsort(key[idx], kind="stable")]
+
+def _pct_share(part: pd.Series, total: pd.Series) -> np.ndarray:
+    """part/total*100 (소수 2자리). 나눗셈 결과 버퍼 하나에 곱셈·반올림을 in-place로(중간 배열 없음)."""
+    out = np.empty(len(part), dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):  # 0/결측 합계는 pandas와 같게 inf/NaN
+        np.divide(part.to_numpy(dtype=float, na_value=np.nan), total.to_numpy(dtype=float, na_value=np.nan), out=out)
+    np.multiply(out, 100.0, out=out)
+    return np.round(out, 2, out=out)
+
+def level_lookup(dim: pd.DataFrame, level: str) -> pd.Series:
+    """
+    corp_code → level 조회표(corp_code 인덱스 Series). 같은 dim/level로 여러 지표를 계산할 때 한 번만 만들어
+    compute_*의 level_map 인자로 넘기면 지표마다 dim과 merge하지 않고 해시 조회(map) 한 번으로 레벨을 붙임.
+    """
+    d = dim.drop_duplicates("corp_code")
+    # .values: level이 category면 Categorical 그대로 유지
+    return pd.Series(d[level].values, index=d["corp_code"].to_numpy(), name=level)
+
+def _with_level(df: pd.DataFrame, dim: pd.DataFrame, level: str, level_map: pd.Series = None) -> pd.DataFrame:
+    # merge(how="left")와 같은 결과(행 순서 유지, 없는 회사는 NaN)를 map 한 번으로
+    if level_map is None:
+        level_map = level_lookup(dim, level)
+    return df.assign(**{level: df["corp_code"].map(level_map)})
+
+def compute_profit_rate(df_fin: pd.DataFrame, dim: pd.DataFrame, level: str, year: int,
+                        level_map: pd.Series = None):
+    # 연도 비교는 정수로(문자열 변환 없이), 필요한 컬럼만 잘라서 레벨 조회
+    fy = pd.to_numeric(df_fin["fiscal_year"], errors="coerce").to_numpy()
+    base = _with_level(df_fin.loc[fy == int(year), ["corp_code","net_income"]], dim, level, level_map)
     if base.empty:
         return pd.DataFrame(columns=[level,"firms","prof","profit_rate"])
-    grp = base.groupby(level, dropna=False).agg(
+    # 흑자 여부를 한 번에 계산 → groupby는 네이티브 sum(그룹별 파이썬 lambda 없음)
+    base["_prof"] = _as_float(base["net_income"]).to_numpy() > 0
+    grp = base.groupby(level, dropna=False, observed=True).agg(
         firms=("corp_code","nunique"),
-        prof=("net_income", lambda s: (pd.to_numeric(s, errors="coerce")>0).sum())
+        prof=("_prof","sum")
     ).reset_index()
     grp["profit_rate"] = grp["prof"] / grp["firms"].replace({0: None})
     return grp
 
 def compute_risk_rate(df_events: pd.DataFrame, dim: pd.DataFrame, level: str, year: int,
-                      risk_types: Tuple[str,...] = ("DEFAULT","OPS_SUSPEND","REHAB","LIQUIDATION","BANK_GROUP")):
+                      risk_types: Tuple[str,...] = ("DEFAULT","OPS_SUSPEND","REHAB","LIQUIDATION","BANK_GROUP"),
+                      level_map: pd.Series = None):
     if df_events.empty:
         return pd.DataFrame(columns=[level,"risk_events","risk_rate"])
-    df_events = df_events.copy()
-    df_events["y"] = pd.to_datetime(df_events["event_date"], errors="coerce").dt.year
-    e = df_events[df_events["y"]==year]
-    e = e[e["event_type"].isin(risk_types)]
+    # 연도·유형 조건을 불리언 마스크 하나로(전체 복사/임시 컬럼 없이), 결합에는 필요한 컬럼만
+    m = _event_year_mask(df_events, year) & df_events["event_type"].isin(risk_types).to_numpy()
+    e = df_events.loc[m, ["corp_code"]]
     if e.empty:
         return pd.DataFrame(columns=[level,"risk_events","risk_rate"])
     # 기업 기준으로 중복 제거(한 해 여러 건이면 1로 카운트할지 선택, 여기선 건수 합계)
-    e = e.merge(dim[["corp_code", level]], on="corp_code", how="left")
-    risk_cnt = e.groupby(level, dropna=False).agg(risk_events=("corp_code","count")).reset_index()
+    e = _with_level(e, dim, level, level_map)
+    risk_cnt = e.groupby(level, dropna=False, observed=True).agg(risk_events=("corp_code","count")).reset_index()
     # 분모(기업 수)
-    firm_cnt = dim.groupby(level, dropna=False).agg(firm_count=("corp_code","nunique")).reset_index()
+    firm_cnt = dim.groupby(level, dropna=False, observed=True).agg(firm_count=("corp_code","nunique")).reset_index()
     out = risk_cnt.merge(firm_cnt, on=level, how="left")
     out["risk_rate"] = out["risk_events"] / out["firm_count"].replace({0: None})
     return out
 
-def compute_asset_acq_amt(df_events: pd.DataFrame, dim: pd.DataFrame, level: str, year: int):
+def compute_asset_acq_amt(df_events: pd.DataFrame, dim: pd.DataFrame, level: str, year: int,
+                          level_map: pd.Series = None):
     if df_events.empty:
         return pd.DataFrame(columns=[level,"asset_acq_amt"])
-    df_events = df_events.copy()
-    df_events["y"] = pd.to_datetime(df_events["event_date"], errors="coerce").dt.year
-    e = df_events[df_events["y"]==year]
-    e = e[e["event_type"].isin(("ASSET_ACQ","BIZ_ACQ","EQUITY_ACQ"))]
+    m = _event_year_mask(df_events, year) & df_events["event_type"].isin(("ASSET_ACQ","BIZ_ACQ","EQUITY_ACQ")).to_numpy()
+    e = df_events.loc[m, ["corp_code","amount"]]
     if e.empty:
         return pd.DataFrame(columns=[level,"asset_acq_amt"])
-    e["amount"] = pd.to_numeric(e["amount"], errors="coerce")
-    e = e.merge(dim[["corp_code", level]], on="corp_code", how="left")
-    out = e.groupby(level, dropna=False).agg(asset_acq_amt=("amount","sum")).reset_index()
+    e = _with_level(e.assign(amount=pd.to_numeric(e["amount"], errors="coerce")), dim, level, level_map)
+    out = e.groupby(level, dropna=False, observed=True).agg(asset_acq_amt=("amount","sum")).reset_index()
     return out
 
-def compute_topk_share(df_mcap: pd.DataFrame, dim: pd.DataFrame, level: str, year: int, ks=(3,5,10)):
+def compute_topk_share(df_mcap: pd.DataFrame, dim: pd.DataFrame, level: str, year: int, ks=(3,5,10),
+                       level_map: pd.Series = None):
+    cols = [level,"total_mcap"] + [f"mcap_top{k}_share" for k in ks]
     if df_mcap.empty:
-        cols = [level,"total_mcap"] + [f"mcap_top{k}_share" for k in ks]
         return pd.DataFrame(columns=cols)
-    base = df_mcap.copy()
-    base["y"] = pd.to_datetime(base["date_ref"], errors="coerce").dt.year
-    base = base[base["y"]==year].merge(dim[["corp_code", level]], on="corp_code", how="left")
-    cols = [level,"total_mcap"] + [f"mcap_top{k}_share" for k in ks]
-    out = []
-    for g, gdf in base.groupby(level, dropna=False):
-        gdf = gdf.sort_values("mcap_krw", ascending=False)
-        total = pd.to_numeric(gdf["mcap_krw"], errors="coerce").sum()
-        if total and total > 0:
-            shares = pd.to_numeric(gdf["mcap_krw"], errors="coerce") / total
-        else:
-            shares = pd.Series([0.0]*len(gdf))
-        row = {level: g, "total_mcap": total}
-        for k in ks:
-            row[f"mcap_top{k}_share"] = float(shares.head(k).sum())
-        out.append(row)
-    return pd.DataFrame(out, columns=cols)
+    m = _year_values(df_mcap, "date_ref") == int(year)
+    base = _with_level(df_mcap.loc[m, ["corp_code","mcap_krw"]], dim, level, level_map)
+    # 전체를 시총 내림차순으로 한 번 정렬 → 그룹 내 순위는 cumcount (그룹마다 파이썬 루프/정렬 없음)
+    base = base.assign(mcap_krw=_as_float(base["mcap_krw"])).sort_values("mcap_krw", ascending=False)
+    key = base[level]
+    rank = base.groupby(level, dropna=False, observed=True).cumcount().to_numpy()
+    mcap = base["mcap_krw"]
+    total = mcap.groupby(key, dropna=False, observed=True).sum()
+    out = pd.DataFrame({"total_mcap": total})
+    denom = total.where(total > 0)  # 합계 0/결측 그룹은 점유율 0
+    for k in ks:
+        topk = mcap.where(rank < k).groupby(key, dropna=False, observed=True).sum()
+        out[f"mcap_top{k}_share"] = (topk / denom).fillna(0.0)
+    return out.rename_axis(level).reset_index()[cols]
 
 def compute_top100_companies(df_fin: pd.DataFrame, df_mcap: pd.DataFrame, dim: pd.DataFrame,
                              level: str, year: int, sort_metric="net_income", topn=100):
     # 연도 필터 & 결합
-    fin = df_fin[df_fin["fiscal_year"].astype(str)==str(year)].copy()
-    fin[sort_metric] = pd.to_numeric(fin[sort_metric], errors="coerce")
-    # 회사당 1행(연결/별도 중복 제거) — 가장 큰 값 우선
-    fin = fin.sort_values(sort_metric, ascending=False).drop_duplicates("corp_code", keep="first")
+    fy = pd.to_numeric(df_fin["fiscal_year"], errors="coerce").to_numpy()
+    fin = df_fin.loc[fy == int(year)]
+    # 회사당 1행(연결/별도 중복 제거) — 가장 큰 값 우선. 시총/점유율 기준이면 재무 컬럼이 아니므로 순이익으로 중복 제거
+    dedup_key = sort_metric if sort_metric in fin.columns else "net_income"
+    fin = fin.assign(**{dedup_key: _as_float(fin[dedup_key])})
+    fin = fin.sort_values(dedup_key, ascending=False).drop_duplicates("corp_code", keep="first")
 
     # 시총/점유율 계산
-    mcap = df_mcap.copy()
-    mcap["y"] = pd.to_datetime(mcap["date_ref"], errors="coerce").dt.year
-    mcap = mcap[mcap["y"]==year][["corp_code","mcap_krw"]]
+    mcap = df_mcap.loc[_year_values(df_mcap, "date_ref") == int(year), ["corp_code","mcap_krw"]]
 
     base = (fin.merge(dim[["corp_code","corp_name","stock_code",level]], on="corp_code", how="left")
                .merge(mcap, on="corp_code", how="left"))
 
-    # 카테고리별 시총합으로 점유율 계산
-    base["_mcap"] = pd.to_numeric(base["mcap_krw"], errors="coerce")
-    total_by_cat = base.groupby(level, dropna=False)["_mcap"].sum().rename("_cat_mcap")
-    base = base.merge(total_by_cat, on=level, how="left")
-    base["share_in_category_pct"] = (base["_mcap"] / base["_cat_mcap"] * 100).round(2)
-
-    # 정렬/TopN
-    base = base.sort_values(sort_metric, ascending=False).head(topn).copy()
-    base.insert(0, "rank", range(1, len(base)+1))
-    # 선택 컬럼
-    out = base[[
-        "rank","corp_name","stock_code",level, sort_metric,"op_income","revenue",
+    # 카테고리별 시총합: groupby→merge 대신 transform으로 행마다 바로 붙임(중간 집계 프레임/추가 결합 없음)
+    base["_mcap"] = _as_float(base["mcap_krw"])
+    cat_mcap = base.groupby(level, dropna=False, observed=True)["_mcap"].transform("sum")
+    base["share_in_category_pct"] = _pct_share(base["_mcap"], cat_mcap)
+
+    # 정렬/TopN: 전체 정렬 대신 argpartition으로 상위 topn만 골라 그 안에서만 정렬
+    # (nlargest와 달리 NaN도 맨 뒤에 남겨 topn개를 채움)
+    # 전체 폭 복사 없이: 상위 행·출력 컬럼만 골라낸 새 프레임에 rank를 붙임
+    top = base.iloc[_top_n_order(_as_float(base[sort_metric]).to_numpy(dtype=float, na_value=np.nan), topn)]
+    # sort_metric이 mcap_krw/share_in_category_pct여도 컬럼이 중복되지 않게
+    cols = list(dict.fromkeys([
+        "corp_name","stock_code",level, sort_metric,"op_income","revenue",
         "mcap_krw","share_in_category_pct","corp_code"
-    ]].rename(columns={level:"gics_level"})
-    return out.reset_index(drop=True)
+    ]))
+    out = top[cols].rename(columns={level:"gics_level"}).reset_index(drop=True)
+    out.insert(0, "rank", range(1, len(out)+1))
+    return out